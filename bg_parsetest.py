@@ -1,15 +1,32 @@
 
-import pytest
+# pint and textx are slow to import, and a unit registry or metamodel slower still to build,
+# so each is only loaded the first time it's used and then kept for the rest of the process.
+# pint brings in uncertainties itself the first time plus_minus is used.
 
-import pint.errors
-from pint import UnitRegistry
-from uncertainties import ufloat
-ur = UnitRegistry()
+class _LazyRegistry(object):
+	def __init__(self):
+		self._registry = None
 
-from textx.metamodel import metamodel_from_file
+	def __getattr__(self, name):
+		if self._registry is None:
+			from pint import UnitRegistry
+			self._registry = UnitRegistry()
+		return getattr(self._registry, name)
+
+ur = _LazyRegistry()
+
+_metamodel = None
+
+def _requirement_metamodel():
+	global _metamodel
+	if _metamodel is None:
+		from textx.metamodel import metamodel_from_file
+		_metamodel = metamodel_from_file('biggles_requirement.tx')
+	return _metamodel
 
 def re_process(string, _locals=None):
 	import re
+	import pint.errors
 
 	def sub_units(match):
 		try:
@@ -34,7 +51,7 @@ def re_process(string, _locals=None):
 
 
 def modgrammar_process(string):
-	mm = metamodel_from_file('biggles_requirement.tx')
+	mm = _requirement_metamodel()
 
 
 
@@ -79,5 +96,6 @@ def test_f3():
 
 
 if __name__ == '__main__':
+	import pytest
 	pytest.main(['-x', __file__])
 
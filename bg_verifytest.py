@@ -0,0 +1,801 @@
+# Behaviour checks for models, their caches and the ways of verifying them, grouped by
+# feature. Every model is built in a model context of its own.
+
+import json
+import os
+import threading
+
+import biggles
+import biggles_bench
+import biggles_cache
+import biggles_import
+import biggles_service
+import biggles_snapshot
+
+
+def _results(results):
+	return [(str(result.owner), result.severity, result.message) for result in results]
+
+def _model(generator, size=300):
+	context = biggles.ModelContext(generator)
+	with context:
+		system = biggles_bench.GENERATORS[generator](size)
+	return context, system
+
+def _raises(function, *args):
+	try:
+		function(*args)
+	except biggles.VerificationException:
+		return True
+	return False
+
+def _design(subsystem, **properties):
+	design = biggles.Design("{} design".format(subsystem.name))
+	design.add_property(**properties)
+	design.implements(subsystem)
+	return design
+
+# A system with a few named parts, one of them wide enough for its aggregates to use columns
+def _vehicle():
+	context = biggles.ModelContext("vehicle")
+	with context:
+		system = biggles.System("vehicle")
+		_design(system, mass="sum children", width="chassis.width + 100mm")
+		biggles.Requirement("shall be light", mass__lte="500kg").allocate_to(system)
+
+		chassis = biggles.Subsystem("chassis", system)
+		_design(chassis, mass="sum children", width="1000mm")
+		biggles.Requirement("shall be narrow", width__lte="1200mm").allocate_to(chassis)
+
+		for i in range(100):
+			_design(biggles.Subsystem("bolt_{}".format(i), chassis), mass="1kg")
+
+	return context, system, chassis
+
+
+# Property cache invalidation
+
+def test_edit_invalidates_readers():
+	context, system, chassis = _vehicle()
+	with context:
+		assert(system.design.get_property('mass') == 100.0)
+		assert(abs(system.design.get_property('width') - 1.1) < 1e-9)
+
+		chassis.children[0].design.add_property(mass="11kg")
+		assert(system.design.get_property('mass') == 110.0)
+
+		chassis.design.add_property(width="2m")
+		assert(abs(system.design.get_property('width') - 2.1) < 1e-9)
+
+def test_structure_edits_invalidate_aggregates():
+	context, system, chassis = _vehicle()
+	with context:
+		assert(chassis.design.get_property('mass') == 100.0)
+
+		_design(biggles.Subsystem("bracket", chassis), mass="5kg")
+		assert(chassis.design.get_property('mass') == 105.0)
+
+		# A derived member, then a different design on an existing member
+		chassis.children[1].design.add_property(mass="2kg + 3kg")
+		assert(chassis.design.get_property('mass') == 109.0)
+		_design(chassis.children[1], mass="20kg")
+		assert(chassis.design.get_property('mass') == 124.0)
+		assert(system.design.get_property('mass') == 124.0)
+
+
+# Incremental verification
+
+def test_incremental_verify_sees_edits():
+	context, system, chassis = _vehicle()
+	with context:
+		before = _results(system.verify())
+		assert(_results(system.verify(incremental=True)) == before)
+
+		chassis.design.add_property(width="1500mm")
+		after = _results(system.verify(incremental=True))
+		assert(before != after)
+		assert(after == _results(system.verify()))
+
+		biggles.Requirement("shall have a bolt", mass__gte="1kg").allocate_to(chassis.children[0])
+		assert(_results(system.verify(incremental=True)) == _results(system.verify()))
+
+
+# Aggregates over wide scopes
+
+def test_wide_aggregates_follow_their_members():
+	with biggles.ModelContext():
+		hub = biggles.System("hub")
+		_design(hub, load="sum interfaces")
+		meter = biggles.Subsystem("meter", None)
+		_design(meter, load="max interfaces")
+		loads = []
+		for i in range(80):
+			load = biggles.Subsystem("load_{}".format(i), None)
+			_design(load, load="{}W".format(i))
+			hub.interfaces_with(load)
+			meter.interfaces_with(load)
+			loads.append(load)
+
+		assert(hub.design.get_property('load') == sum(range(80)))
+		assert(meter.design.get_property('load') == 79.0)
+
+		loads[3].design.add_property(load="1kW")
+		assert(meter.design.get_property('load') == 1000.0)
+		assert(hub.design.get_property('load') == sum(range(80)) - 3 + 1000)
+
+		# A derived member joining the scope
+		extra = biggles.Subsystem("extra", None)
+		_design(extra, load="2 * 1kW")
+		meter.interfaces_with(extra)
+		assert(meter.design.get_property('load') == 2000.0)
+
+		# A member in other units is caught through the column's dimensions too
+		loads[5].design.add_property(load="5kg")
+		assert(_raises(hub.design.get_property, 'load'))
+
+def test_rollup_matches_get_property():
+	context, system, chassis = _vehicle()
+	with context:
+		chassis.children[0].design.add_property(mass="2kg + 3kg")
+		values = biggles.rollup(system, 'mass')
+		assert(values[system] == system.design.get_property('mass') == 104.0)
+		assert(values[chassis] == 104.0)
+		assert(values[chassis.children[0]] == 5.0)
+
+
+# Parallel verification
+
+def test_parallel_verify_matches_serial():
+	for generator in sorted(biggles_bench.GENERATORS):
+		context, system = _model(generator)
+		with context:
+			serial = _results(system.verify())
+			context.cache.clear()
+			assert(_results(system.verify(workers=2)) == serial)
+			assert(_results(system.verify(workers=3, incremental=True)) == serial)
+
+
+# Streaming verification
+
+def test_iter_verify_streams_and_stops_at_the_first_error():
+	context, system = _model('requirements', 2000)
+	with context:
+		system.children[0].design.add_property(mass="1000000kg")
+		serial = _results(system.verify())
+		errors = [result for result in serial if result[1] == biggles.VerificationResult.ERROR]
+		assert(errors and serial.index(errors[0]) < len(serial) - 1)
+		assert(_results(system.iter_verify(severities=[biggles.VerificationResult.ERROR])) == errors)
+
+		context.cache.clear()
+		results = system.iter_verify(stop_on_error=True)
+		assert(_results([next(results)]) == serial[:1])
+		results = serial[:1] + _results(results)
+		assert(results == serial[:serial.index(errors[0]) + 1])
+
+
+# Units
+
+def _close(a, b):
+	return abs(a - b) <= 1e-9 * max(abs(a), abs(b))
+
+def test_units_resolve_prefixes_and_powers():
+	newton = biggles._dimension(m=1, kg=1, s=-2)
+	for unit, scale, dimension in (
+			('kN', 1e3, newton),
+			('mm2', 1e-6, biggles._dimension(m=2)),
+			('s-1', 1.0, biggles._dimension(s=-1)),
+			('kg', 1.0, biggles._dimension(kg=1)),
+			('daN', 10.0, newton),
+			('uF', 1e-6, biggles._dimension(m=-2, kg=-1, s=4, A=2)),
+			('kWh', 3.6e6, biggles._dimension(m=2, kg=1, s=-2)),
+			('min', 60.0, biggles._dimension(s=1)),
+			('cd', 1.0, biggles._dimension(cd=1)),
+			('deg', 0.017453292519943295, biggles.DIMENSIONLESS)):
+		found = biggles._lookup_unit(unit)
+		assert(_close(found[0], scale) and found[1] == dimension)
+
+	for unit in ('furlong', 'xN', 'k', 'm2x'):
+		try:
+			biggles._lookup_unit(unit)
+		except KeyError:
+			pass
+		else:
+			assert(False)
+
+	assert(_close(biggles._parse_literal("2000mm")[0], 2.0))
+	assert(biggles._parse_literal("True") == (True, None))
+	assert(_raises(biggles._parse_literal, "3 furlongs"))
+
+
+# Traceability
+
+def test_traceability_follows_edits():
+	context, system, chassis = _vehicle()
+	with context:
+		index = context.traceability
+		light, = index.requirements_with_parameter('mass')
+		narrow, = index.requirements_allocated_to(chassis)
+		assert(index.requirements_touching('chassis.width') == set([narrow]))
+		assert((chassis.children[7].design, 'mass') in index.properties_read_by(light))
+
+		system.design.add_property(mass="chassis.width * 1kg")
+		assert(index.requirements_touching('chassis.width') == set([light, narrow]))
+		assert(index.properties_read_by(light) == set([(system.design, 'mass'), (chassis.design, 'width')]))
+
+		narrow.allocate_to(chassis.children[0])
+		assert(index.requirements_allocated_to(chassis) == set())
+		assert(index.requirements_touching((chassis.children[0], 'width')) == set([narrow]))
+
+
+# Snapshots
+
+def test_snapshot_round_trip(tmpdir):
+	path = str(tmpdir.join('model.bgs'))
+	for generator in sorted(biggles_bench.GENERATORS):
+		context, system = _model(generator)
+		with context:
+			expected = _results(system.verify())
+			biggles_snapshot.save(system, path)
+
+		loaded = biggles_snapshot.load(path, biggles.ModelContext())
+		assert(_results(loaded.verify()) == expected)
+
+def test_loaded_snapshot_follows_edits(tmpdir):
+	path = str(tmpdir.join('vehicle.bgs'))
+	context, system, chassis = _vehicle()
+	with context:
+		biggles_snapshot.save(system, path)
+
+	context = biggles.ModelContext()
+	system = biggles_snapshot.load(path, context)
+	chassis = system.children[0]
+	with context:
+		assert(system.design.get_property('mass') == 100.0)
+		assert(context.traceability.requirements_touching('chassis.width') == set(chassis.requirements))
+
+		chassis.children[0].design.add_property(mass="11kg")
+		_design(biggles.Subsystem("bracket", chassis), mass="5kg")
+		assert(system.design.get_property('mass') == 115.0)
+
+def test_snapshot_saves_ancestors_reached_through_interfaces(tmpdir):
+	path = str(tmpdir.join('model.bgs'))
+	with biggles.ModelContext():
+		system = biggles.System("car")
+		hand = biggles.Subsystem("hand", biggles.Subsystem("arm", biggles.User("driver")))
+		_design(hand, grip="20N")
+		system.interfaces_with(hand)
+		biggles_snapshot.save(system, path)
+
+	loaded = biggles_snapshot.load(path, biggles.ModelContext())
+	hand = loaded.neighbours()[0]
+	assert(hand.parent.name == "arm" and hand.parent.parent.name == "driver")
+	assert(hand.design.get_property('grip') == 20.0)
+
+def test_snapshot_rejects_other_files(tmpdir):
+	for contents in ("", "not a snapshot at all"):
+		path = tmpdir.join('other')
+		path.write(contents)
+		try:
+			biggles_snapshot.load(str(path), biggles.ModelContext())
+		except biggles_snapshot.SnapshotException:
+			pass
+		else:
+			assert(False)
+
+
+# Bulk import
+
+def test_import_matches_scripted_model(tmpdir):
+	context, system, chassis = _vehicle()
+	with context:
+		expected = _results(system.verify())
+
+	records = [
+		{'type': 'subsystem', 'id': 's', 'name': "vehicle", 'kind': 'system'},
+		{'type': 'subsystem', 'id': 'c', 'name': "chassis", 'parent': 's'},
+		{'type': 'design', 'id': 'ds', 'name': "vehicle design", 'implements': 's',
+			'properties': {'mass': "sum children", 'width': "chassis.width + 100mm"}},
+		{'type': 'design', 'id': 'dc', 'name': "chassis design", 'implements': 'c',
+			'properties': {'mass': "sum children", 'width': "1000mm"}},
+		{'type': 'requirement', 'id': 'r1', 'text': "shall be light", 'parameter': 'mass__lte', 'value': "500kg", 'allocated_to': 's'},
+		{'type': 'requirement', 'id': 'r2', 'text': "shall be narrow", 'parameter': 'width__lte', 'value': "1200mm", 'allocated_to': 'c'},
+	]
+	# Children listed before their parent's record is fine
+	for i in reversed(range(100)):
+		records.append({'type': 'subsystem', 'id': 'b{}'.format(i), 'name': "bolt_{}".format(i), 'parent': 'c'})
+		records.append({'type': 'design', 'id': 'db{}'.format(i), 'name': "bolt_{} design".format(i), 'implements': 'b{}'.format(i), 'mass': "1kg"})
+	records.sort(key=lambda record: record['type'] != 'design')
+
+	path = str(tmpdir.join('model.jsonl'))
+	with open(path, 'w') as f:
+		for record in records:
+			f.write(json.dumps(record) + "\n")
+
+	imported = biggles_import.import_model([path], context=biggles.ModelContext())
+	assert(sorted(_results(imported.verify())) == sorted(expected))
+
+
+def test_requirement_list_removal_and_compaction():
+	with biggles.ModelContext():
+		items = [biggles.Requirement("requirement {}".format(i)) for i in range(40)]
+	requirements = biggles.RequirementList(items[:4])
+	requirements.remove(items[1])
+	assert(list(requirements) == [items[0], items[2], items[3]])
+
+	requirements = biggles.RequirementList(items)
+	for item in items[:30:2]:
+		requirements.remove(item)
+	kept = items[1:30:2] + items[30:]
+	assert(list(requirements) == kept and len(requirements) == len(kept))
+	assert(items[0] not in requirements and items[1] in requirements)
+	assert(requirements[0] is items[1] and requirements[-1] is items[-1])
+
+	# Enough removals compact the list, which keeps its order
+	for item in kept[:20]:
+		requirements.remove(item)
+	assert(list(requirements) == kept[20:] and requirements[0] is kept[20])
+	requirements.append(items[0])
+	assert(list(requirements)[-1] is items[0] and items[0] in requirements)
+
+	try:
+		requirements.remove(items[2])
+	except ValueError:
+		pass
+	else:
+		assert(False)
+
+
+# Instrumentation
+
+def test_instrumentation_counts_times_and_traces(tmpdir):
+	context, system, chassis = _vehicle()
+	events = []
+	with context:
+		instrumentation = biggles.Instrumentation(hooks=[lambda *event: events.append(event)], trace=True)
+		with instrumentation:
+			expected = system.design.get_property('width')
+			assert(system.design.get_property('width') == expected)
+			system.verify()
+
+		assert(context.instrumentation is None)
+		assert(instrumentation.lookups == instrumentation.hits + instrumentation.misses)
+		assert(instrumentation.hits >= 1 and instrumentation.remote_lookups >= 1)
+		assert(instrumentation.checks == 2 and instrumentation.max_depth >= 2)
+		assert(('evaluate', chassis.design, 'width', 1.0) in [event[:4] for event in events])
+		assert([event[0] for event in events] == [event[0] for event in instrumentation.trace])
+
+		key, seconds = instrumentation.slowest_properties(1)[0]
+		assert(key in instrumentation.property_time and seconds <= instrumentation.property_time[key])
+		assert("requirement checks" in instrumentation.summary())
+
+		path = str(tmpdir.join('trace.tsv'))
+		instrumentation.write_trace(path)
+		lines = open(path).read().splitlines()
+		assert(len(lines) == len(events))
+		assert("evaluate\tchassis design\twidth\t1.0\t" in "\n".join(lines))
+
+		# Without a trace there's nothing to write
+		try:
+			biggles.Instrumentation().write_trace(path)
+		except biggles.OperationException:
+			pass
+		else:
+			assert(False)
+
+		# Results don't depend on whether anything's watching
+		results = _results(system.verify())
+		context.cache.clear()
+		with biggles.Instrumentation():
+			assert(_results(system.verify()) == results)
+
+
+# Dependency ordering
+
+def _chain(length):
+	context = biggles.ModelContext()
+	with context:
+		system = biggles.System("chain")
+		properties = dict(("p{}".format(i), "p{} + 1m".format(i + 1)) for i in range(length))
+		properties["p{}".format(length)] = "0m"
+		design = _design(system, **properties)
+	return context, system, design
+
+def test_deep_chains_evaluate_past_the_recursion_budget():
+	length = 5 * biggles._recursion_budget
+	context, system, design = _chain(length)
+	with context:
+		order = biggles.evaluation_order([(design, 'p0')])
+		assert(order[0] == (design, 'p{}'.format(length)) and order[-1] == (design, 'p0'))
+
+		assert(design.get_property('p0') == float(length))
+		assert(biggles.evaluation_order([(design, 'p0')]) == [(design, 'p0')])
+
+		design.add_property(p2="7m")
+		assert(design.get_property('p0') == 9.0)
+
+def test_circular_definitions_are_found():
+	context, system, chassis = _vehicle()
+	with context:
+		system.design.add_property(p="q + 1m", q="r", r="p")
+		for function, args in ((biggles.evaluation_order, [[(system.design, 'p')]]), (biggles.evaluate_all, [system]),
+				(system.design.get_property, ['q'])):
+			try:
+				function(*args)
+			except biggles.CircularDefinitionException as e:
+				assert("vehicle design.p" in str(e))
+			else:
+				assert(False)
+
+		system.design.add_property(r="2m")
+		values = dict(((design, prop), value) for design, prop, value, error in biggles.evaluate_all(system))
+		assert(values[(system.design, 'p')] == 3.0)
+		assert(values[(chassis.design, 'mass')] == 100.0)
+
+def test_parallel_ignores_cycles_nothing_reads():
+	context, system, chassis = _vehicle()
+	with context:
+		system.design.add_property(p="q", q="p")
+		assert(_results(system.verify(workers=2)) == _results(system.verify()))
+
+
+# Tolerances
+
+def test_tolerances_propagate():
+	with biggles.ModelContext():
+		system = biggles.System("gauge")
+		design = _design(system, a="10mm +/- 1mm", e="5mm +/- 2mm", b="a * 2", c="a - a", d="a + e", f="b + 1mm")
+		at_most = biggles.Requirement("short enough", a__lte="10mm")
+		at_most.allocate_to(system)
+		doubled = biggles.Requirement("doubled short enough", f__lte="23mm")
+		doubled.allocate_to(system)
+
+		b = design.get_property('b')
+		assert(_close(b.nominal, 0.02) and _close(b.std_dev, 0.002))
+		assert(design.get_property('c').std_dev == 0.0)
+		assert(_close(design.get_property('d').std_dev, 0.001 * 5 ** 0.5))
+		assert(design.get_property('a') <= 0.01 and design.get_property('f') > 0.02)
+
+		probabilities = biggles.pass_probabilities([at_most, doubled])
+		assert(_close(probabilities[at_most], 0.5))
+		assert(abs(probabilities[doubled] - 0.8413) < 1e-3)
+
+		sampled = biggles.pass_probabilities([at_most, doubled], samples=20000, seed=1)
+		assert(abs(sampled[at_most] - 0.5) < 0.02 and abs(sampled[doubled] - 0.8413) < 0.02)
+		assert(sampled == biggles.pass_probabilities([at_most, doubled], samples=20000, seed=1))
+
+		# Sampling leaves the model's own values alone
+		assert(design.get_property('b') is b)
+
+
+# Expressions
+
+def test_typo_in_a_reference_fails_verification():
+	with biggles.ModelContext():
+		system = biggles.System("box")
+		design = _design(system, width="widht", material="steel", depth="chassis.dpeth", height="chassis.depth * 2")
+		_design(biggles.Subsystem("chassis", system), depth="1m")
+		requirement = biggles.Requirement("shall be narrow", width__lte="2m")
+		requirement.allocate_to(system)
+
+		assert(_raises(system.verify))
+		for prop in ('width', 'material', 'depth'):
+			assert(_raises(design.get_property, prop))
+		assert(design.get_property('height') == 2.0)
+
+		design.add_property(width="height")
+		assert(_results(requirement.verify()) == [(str(requirement), biggles.VerificationResult.INFO, "Requirement passed: 2.0 lte 2m")])
+
+def test_literals_and_expressions_share_a_grammar():
+	for literal in ("1.5e3 N", "5s-1", "12mm", ".5 kg", "+5kg"):
+		value = biggles._parse_literal(literal)[0]
+		expression = biggles.compile_expression("2 * ({})".format(literal))
+		assert(isinstance(expression, biggles._Constant))
+		assert(abs(expression.value - 2 * value) < 1e-9)
+
+	assert(biggles.compile_expression("10m-2m").value == 8.0)
+
+def test_expressions_parse_and_report_errors():
+	with biggles.ModelContext():
+		system = biggles.System("box")
+		design = _design(system, width="1m", depth="-(width - 300mm) * 2 / 4", area="width * depth", broken="width * (2m")
+		assert(_close(design.get_property('depth'), -0.35))
+		assert(design.dimension_of('area') == biggles._dimension(m=2))
+
+		assert(isinstance(biggles.compile_expression("width * (2m"), biggles._Unparseable))
+		assert(_raises(design.get_property, 'broken'))
+		assert(biggles.compile_expression("sum children").scope == 'children')
+		assert(biggles.compile_expression("front frame.length").obj_name == "front frame")
+
+
+# Dimension inference
+
+def test_mixed_dimensions_raise():
+	context, system, chassis = _vehicle()
+	with context:
+		chassis.children[0].design.add_property(mass="5s")
+		assert(_raises(chassis.design.get_property, 'mass'))
+
+		chassis.children[0].design.add_property(mass="5kg")
+		assert(chassis.design.get_property('mass') == 104.0)
+
+def test_leaf_edit_keeps_unrelated_dimensions():
+	context = biggles.ModelContext()
+	with context:
+		system = biggles.System("tree")
+		_design(system, mass="sum children", weight="mass * 9.81")
+		branches = []
+		for i in range(4):
+			branch = biggles.Subsystem("branch_{}".format(i), system)
+			_design(branch, mass="sum children")
+			for j in range(3):
+				_design(biggles.Subsystem("leaf_{}_{}".format(i, j), branch), mass="2kg")
+			branches.append(branch)
+
+		dimensions = context.cache.dimensions
+		system.design.get_property('weight')
+		inferred = dict(dimensions)
+		assert((branches[1].design, 'mass') in inferred)
+
+		# The same units again leaves every inferred dimension alone
+		branches[0].children[0].design.add_property(mass="3kg")
+		assert(dimensions == inferred)
+		assert(system.design.get_property('mass') == 25.0)
+
+		# Different units only drop what reads the edited leaf
+		branches[0].children[0].design.add_property(mass="3s")
+		assert((branches[0].design, 'mass') not in dimensions)
+		assert((system.design, 'weight') not in dimensions)
+		assert(dimensions[(branches[1].design, 'mass')] == inferred[(branches[1].design, 'mass')])
+		assert(_raises(system.design.get_property, 'weight'))
+
+
+# Design-space sweeps
+
+def test_sweep_passes_variants():
+	context, system, chassis = _vehicle()
+	with context:
+		narrow, = chassis.requirements
+		light, = system.requirements
+		table = biggles.full_factorial({'chassis.width': ["1m", "1100mm", "1300mm"], (chassis.children[0], 'mass'): ["1kg", "500kg"]})
+		assert(len(table[(chassis.design, 'width')]) == 6)
+
+		result = biggles.sweep([narrow, light], table, properties=['vehicle.width'])
+		assert(len(result) == 6)
+		passing = []
+		for i in range(len(result)):
+			variant = result.variant(i)
+			width, mass = variant[(chassis.design, 'width')], variant[(chassis.children[0].design, 'mass')]
+			assert(list(result.passed[i]) == [width <= 1.2, mass + 99 <= 500])
+			assert(_close(result.values[(system.design, 'width')][i], width + 0.1))
+			if all(result.passed[i]):
+				passing.append(i)
+		assert(list(result.passing()) == passing and len(passing) == 2)
+
+		# The model itself is left as it was
+		assert(chassis.design.get_property('width') == 1.0)
+
+		for table in ({'chassis.width': ["1kg"]}, {'chassis.width': ["1m", "2m"], 'chassis.mass': ["1kg"]}):
+			try:
+				biggles.sweep([narrow], table)
+			except biggles.BigglesException:
+				pass
+			else:
+				assert(False)
+
+
+# Interface adjacency
+
+def test_neighbourhood_by_hops():
+	with biggles.ModelContext():
+		system = biggles.System("ring")
+		parts = [biggles.Subsystem("part_{}".format(i), system) for i in range(6)]
+		for a, b in zip(parts, parts[1:]):
+			a.interfaces_with(b)
+		parts[0].interfaces_with(parts[1], name="second link")
+		with biggles.BulkBuilder() as builder:
+			builder.connect("bus", [parts[0], parts[2], parts[4]])
+
+		assert(parts[0].neighbours() == [parts[1], parts[2], parts[4]])
+		assert(parts[0].neighbourhood() == [(parts[1], 1), (parts[2], 1), (parts[4], 1)])
+		assert(parts[0].neighbourhood(2) == [(parts[1], 1), (parts[2], 1), (parts[4], 1), (parts[3], 2), (parts[5], 2)])
+		assert(parts[5].neighbourhood(10) == [(parts[4], 1), (parts[3], 2), (parts[0], 2), (parts[2], 2), (parts[1], 3)])
+		assert(parts[0].neighbourhood(0) == [])
+		assert(len(parts[0].interfaces) == 3)
+
+
+# Model contexts
+
+def test_contexts_build_and_verify_from_threads():
+	expected = {}
+	for generator in ('uniform', 'interfaces', 'requirements'):
+		context, system = _model(generator)
+		with context:
+			expected[generator] = _results(system.verify())
+
+	found = {}
+	def build(generator):
+		context, system = _model(generator)
+		with context:
+			assert(biggles.current_context() is context)
+			found[generator] = _results(system.verify())
+
+	threads = [threading.Thread(target=build, args=(generator,)) for generator in expected]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+
+	assert(found == expected)
+	assert(biggles.current_context() is biggles.default_context)
+
+def test_contexts_keep_their_models_apart():
+	first, second = biggles.ModelContext("first"), biggles.ModelContext("second")
+	with first:
+		system = biggles.System("car")
+		requirement = biggles.Requirement("shall be light", mass__lte="1kg")
+	with second:
+		other = biggles.System("car")
+		design = biggles.Design("car design")
+
+	def link(function, *args):
+		try:
+			function(*args)
+		except biggles.SystemDefinitionException:
+			return False
+		return True
+
+	assert(not link(design.implements, system))
+	assert(not link(system.interfaces_with, other))
+	assert(not link(requirement.allocate_to, other))
+	assert(link(requirement.allocate_to, system))
+	with first:
+		assert(not link(biggles.System, "another car"))
+
+	# Children join their parent's context wherever they're created
+	with second:
+		wheel = biggles.Subsystem("wheel", system)
+	assert(wheel._context is first and system.children == [wheel])
+
+
+# Persistent verification cache
+
+def _errors(results):
+	return [owner for owner, severity, message in results if severity == biggles.VerificationResult.ERROR]
+
+def test_cached_verify_matches_serial(tmpdir):
+	for generator in sorted(biggles_bench.GENERATORS):
+		context, system = _model(generator)
+		with context:
+			serial = _results(system.verify())
+			with biggles_cache.VerificationCache(str(tmpdir.join(generator + '.cache'))) as cache:
+				context.cache.clear()
+				assert(_results(system.verify(cache=cache)) == serial)
+				context.cache.clear()
+				assert(_results(system.verify(cache=cache)) == serial)
+				assert(cache.hits)
+
+def test_cached_verify_follows_edits(tmpdir):
+	context, system, chassis = _vehicle()
+	with context, biggles_cache.VerificationCache(str(tmpdir.join('vehicle.cache'))) as cache:
+		assert(_errors(_results(system.verify(cache=cache))) == [])
+
+		# Only keys covering the edited property are worked out again
+		chassis.children[0].design.add_property(mass="450kg")
+		assert(system not in context.cache.content_keys and chassis.children[1] in context.cache.content_keys)
+		results = _results(system.verify(cache=cache))
+		assert(results == _results(system.verify()) and len(_errors(results)) == 1)
+
+		chassis.design.add_property(height="300mm")
+		system.verify(cache=cache)
+		biggles.Requirement("shall be low", height__lte="200mm").allocate_to(chassis)
+		assert(chassis not in context.cache.content_keys)
+		results = _results(system.verify(cache=cache))
+		assert(results == _results(system.verify()) and len(_errors(results)) == 2)
+
+
+# Requirement check tables
+
+def test_check_table_failures_match_errors():
+	context, system, chassis = _vehicle()
+	with context:
+		requirements = []
+		for i, bolt in enumerate(chassis.children):
+			requirements.append(biggles.Requirement("shall be light", mass__lte="{}kg".format(i % 3)))
+			requirements[-1].allocate_to(bolt)
+		wrong = biggles.Requirement("shall be short", mass__lte="1m")
+		wrong.allocate_to(chassis.children[0])
+
+		# Large enough to compare with numpy, then small enough not to
+		for table in (biggles.CheckTable(requirements), biggles.CheckTable(requirements[:10] + [wrong])):
+			errors = [requirement for requirement in table.requirements
+				if _errors(_results(requirement.verify()))]
+			assert(table.failures() == errors)
+		assert(len(table) == 10 and wrong not in table.requirements)
+		assert(len(biggles.CheckTable(requirements).failures()) == 34)
+
+
+
+# The verification service
+
+def _service(tmpdir, **kwargs):
+	path = str(tmpdir.join('service.sock'))
+	server = biggles_service.serve(path, biggles_service.VerificationService(**kwargs))
+	thread = threading.Thread(target=server.serve_forever)
+	thread.daemon = True
+	thread.start()
+	return server, path
+
+def test_service_ops(tmpdir):
+	context, system, chassis = _vehicle()
+	snapshot = str(tmpdir.join('vehicle.bgs'))
+	with context:
+		biggles_snapshot.save(system, snapshot)
+
+	server, path = _service(tmpdir)
+	client = biggles_service.Client(path)
+	try:
+		assert(os.stat(path).st_mode & 0o077 == 0)
+
+		assert(client.request('load', model='vehicle', snapshot=snapshot)['results'] > 0)
+		assert(client.request('models')['models'] == ['vehicle'])
+		assert(client.request('get', model='vehicle', property='vehicle.mass')['value'] == 100.0)
+
+		errors = client.request('verify', model='vehicle', severities=['Error'])['results']
+		assert(errors == [])
+
+		client.request('subscribe', model='vehicle')
+		assert(client.request('edit', model='vehicle', subsystem='chassis', properties={'width': "1500mm"}) == {'added': 1, 'removed': 1})
+		event = client.next_event()
+		assert(event['event'] == 'delta' and event['added'][0][1] == 'Error')
+		assert(client.request('get', model='vehicle', property='vehicle.width')['value'] == 1.6)
+
+		client.request('unload', model='vehicle')
+		assert(client.request('models')['models'] == [])
+	finally:
+		client.close()
+		server.shutdown()
+		server.server_close()
+
+def test_service_rejects_bad_requests(tmpdir):
+	server, path = _service(tmpdir)
+	client = biggles_service.Client(path)
+	try:
+		client.file.write("[1]\n")
+		client.file.flush()
+		assert(client._read()['ok'] is False)
+
+		for op, kwargs in (('load', {'model': 'm', 'script': 'biggles_test.py'}), ('verify', {'model': 'missing'}), ('nonsense', {})):
+			try:
+				client.request(op, **kwargs)
+			except biggles_service.ServiceException:
+				pass
+			else:
+				assert(False)
+
+		# Still connected after all that
+		assert(client.request('models')['models'] == [])
+	finally:
+		client.close()
+		server.shutdown()
+		server.server_close()
+
+def test_service_finds_subsystems_reached_as_neighbours(tmpdir):
+	server, path = _service(tmpdir, allow_scripts=True)
+	client = biggles_service.Client(path)
+	try:
+		script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'biggles_test.py')
+		client.request('load', model='sol', script=script)
+		assert(client.request('get', model='sol', property='interconnector.occupant_cell_lateral_force')['value'] == 5.0)
+
+		# The same result can be reported more than once; every change in count is a delta
+		delta = client.request('edit', model='sol', subsystem='interconnector', properties={'occupant_cell_lateral_force': "20N"})
+		assert(delta['added'] == delta['removed'] > 0)
+	finally:
+		client.close()
+		server.shutdown()
+		server.server_close()
+
+
+if __name__ == '__main__':
+	import pytest
+	pytest.main(['-x', __file__])
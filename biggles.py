@@ -1,79 +1,217 @@
-import re 
+import gc
+import hashlib
+import math
+import operator
+import os
+import re
+import threading
+import time
+
+# numpy is optional, and takes longer to import than the rest of biggles put together, so
+# it's only loaded the first time something has enough numbers to be worth vectorising.
+# Until then np is None; _numpy() loads it and returns it, or None if it isn't installed.
+np = None
+_numpy_loaded = False
+
+def _numpy():
+	global np, _numpy_loaded
+	if not _numpy_loaded:
+		try:
+			import numpy as np
+		except ImportError:
+			np = None
+		_numpy_loaded = True
+	return np
 
 class BigglesException(Exception): pass
 class SystemDefinitionException(BigglesException): pass
 class OperationException(BigglesException): pass
 class VerificationException(BigglesException): pass
 
+# Units map to their scale in SI and their dimension as powers of the SI base quantities:
+# (length, mass, time, current, temperature, amount, luminous intensity)
+def _dimension(m=0, kg=0, s=0, A=0, K=0, mol=0, cd=0):
+	return (m, kg, s, A, K, mol, cd)
+
+DIMENSIONLESS = _dimension()
+
 unit_conversions = {
-	'mm'	: 0.001,
-	'm'		: 1,
-	'N'		: 1,
-	'kg'	: 1,
-	'm2'	: 1
+	'm'		: (1.0,		_dimension(m=1)),
+	'g'		: (0.001,	_dimension(kg=1)),
+	's'		: (1.0,		_dimension(s=1)),
+	'A'		: (1.0,		_dimension(A=1)),
+	'K'		: (1.0,		_dimension(K=1)),
+	'mol'	: (1.0,		_dimension(mol=1)),
+	'cd'	: (1.0,		_dimension(cd=1)),
+	'N'		: (1.0,		_dimension(m=1, kg=1, s=-2)),
+	'Pa'	: (1.0,		_dimension(m=-1, kg=1, s=-2)),
+	'J'		: (1.0,		_dimension(m=2, kg=1, s=-2)),
+	'W'		: (1.0,		_dimension(m=2, kg=1, s=-3)),
+	'Wh'	: (3600.0,	_dimension(m=2, kg=1, s=-2)),
+	'Hz'	: (1.0,		_dimension(s=-1)),
+	'C'		: (1.0,		_dimension(s=1, A=1)),
+	'V'		: (1.0,		_dimension(m=2, kg=1, s=-3, A=-1)),
+	'ohm'	: (1.0,		_dimension(m=2, kg=1, s=-3, A=-2)),
+	'F'		: (1.0,		_dimension(m=-2, kg=-1, s=4, A=2)),
+	'min'	: (60.0,	_dimension(s=1)),
+	'h'		: (3600.0,	_dimension(s=1)),
+	'l'		: (0.001,	_dimension(m=3)),
+	'L'		: (0.001,	_dimension(m=3)),
+	't'		: (1000.0,	_dimension(kg=1)),
+	'rad'	: (1.0,		DIMENSIONLESS),
+	'deg'	: (0.017453292519943295, DIMENSIONLESS),
 }
 
+si_prefixes = {
+	'Y' : 1e24, 'Z' : 1e21, 'E' : 1e18, 'P' : 1e15, 'T' : 1e12, 'G' : 1e9, 'M' : 1e6, 'k' : 1e3,
+	'h' : 1e2, 'da' : 1e1, 'd' : 1e-1, 'c' : 1e-2, 'm' : 1e-3, 'u' : 1e-6, 'n' : 1e-9, 'p' : 1e-12,
+	'f' : 1e-15, 'a' : 1e-18,
+}
+
+# Takes any iterable of results, e.g. the generator from iter_verify(), and prints each one
+# as soon as it's produced
 def prettyprint_verification(results):
 	for result in results:
 		print str(result)
 
+def _filter_results(results, severities, stop_on_error):
+	for result in results:
+		if severities is None or result.severity in severities:
+			yield result
 
-def _normalise_property(prop):
-	if not isinstance(prop, basestring):
-		return prop
+		if stop_on_error and result.severity == VerificationResult.ERROR:
+			return
 
-	if prop.lower() == 'true': return True
-	if prop.lower() == 'false': return False
 
-	try:
-		return float(prop)
-	except ValueError:
-		pass
+_unit_pattern = re.compile(r"([a-zA-Z]+?)(-?\d*)$")
+_unit_cache = {}
 
+# Resolves a unit such as "kN", "mm2" or "s-1" to (scale, dimension). Exact table entries win
+# over prefixed ones, so "min" is minutes rather than milli-inches and "cd" is candela.
+def _lookup_unit(unit):
 	try:
-		val, units = re.match("(\d+)(.*)", prop).groups()
-		val = float(val) * unit_conversions[units]
-		return val
-	except AttributeError, TypeError:
-		raise VerificationException("Can't interpret property {}".format(prop))
+		return _unit_cache[unit]
+	except KeyError:
+		pass
 
-def _find_and_normalise(prop, owner, scope):
-	if not isinstance(prop, basestring):
-		return prop
+	match = _unit_pattern.match(unit)
+	if match is None:
+		raise KeyError(unit)
 
-	if '.' in prop:
-		obj_name, prop = prop.split('.')
+	symbol, power = match.groups()
+	power = int(power) if power else 1
 
-		for obj in scope:
-			if obj.name == obj_name and obj.design is not None:
-				val = obj.design.get_property(prop)
-				print("Found property '{}' = '{}' in subsystem '{}'".format(prop, val, obj_name))
+	if symbol in unit_conversions:
+		scale, dimension = unit_conversions[symbol]
+	else:
+		for prefix in (symbol[:2], symbol[:1]):
+			if prefix in si_prefixes and symbol[len(prefix):] in unit_conversions:
+				scale, dimension = unit_conversions[symbol[len(prefix):]]
+				scale *= si_prefixes[prefix]
 				break
 		else:
-			raise VerificationException("Can't find named object '{}' looking for property '{}'".format(obj_name, prop))
-	else:
-		val = prop
-		print("Property '{}' = '{}' found in owner '{}'".format(prop, val, owner))
-
-	return _normalise_property(val)
+			raise KeyError(unit)
+
+	result = (scale ** power, tuple(d * power for d in dimension))
+	_unit_cache[unit] = result
+	return result
+
+# Numbers and units are written the same way in literals and in expressions. A unit is
+# letters with an optional power ("mm2", "s-1"), and may be separated from its number by
+# spaces; "10m-2m" is 10m - 2m, since a power can't run on into a word.
+_number_syntax = r"(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?"
+_unit_syntax = r"[a-zA-Z]+(?:-?\d+)?(?!\w)"
+
+_quantity_pattern = re.compile(r"\s*([-+]?{})\s*({})?\s*$".format(_number_syntax, _unit_syntax))
+_literal_cache = {}
+_literal_cache_size = 65536
+
+# Parses a literal such as "2000mm", "1.5e3 N" or "True" into (value, dimension); the
+# dimension is None for booleans. Results are remembered since the same literal strings
+# turn up over and over in a model.
+def _parse_literal(prop):
+	try:
+		return _literal_cache[prop]
+	except KeyError:
+		pass
 
-def _collect_remotes(owner, interfaces):
-	remotes = set()
-	for inter in interfaces:
-		remotes = remotes | set(inter.systems)
+	lowered = prop.lower()
+	if lowered == 'true':
+		result = (True, None)
+	elif lowered == 'false':
+		result = (False, None)
+	else:
+		match = _quantity_pattern.match(prop)
+		if match is None:
+			raise VerificationException("Can't interpret property {}".format(prop))
 
-	remotes = remotes - set([owner])
+		number, unit = match.groups()
+		if unit is None:
+			result = (float(number), DIMENSIONLESS)
+		else:
+			try:
+				scale, dimension = _lookup_unit(unit)
+			except KeyError:
+				raise VerificationException("Can't interpret property {}: unknown unit '{}'".format(prop, unit))
+			result = (float(number) * scale, dimension)
 
-	return list(remotes)
+	if len(_literal_cache) >= _literal_cache_size:
+		_literal_cache.clear()
+	_literal_cache[prop] = result
+	return result
 
-def _verify_parameter(actual, operation, literal):
-	import re
+def _normalise_property(prop):
+	if not isinstance(prop, basestring):
+		return prop
 
-	try:
-		act = _normalise_property(actual)
-		lit = _normalise_property(literal)
-	except AttributeError, TypeError:
-		raise VerificationException("Can't interpret literals {}/{}".format(actual, literal))
+	return _parse_literal(prop)[0]
+
+def _dimensions_compatible(a, b):
+	return a is None or b is None or a == b or a == DIMENSIONLESS or b == DIMENSIONLESS
+
+# The dimension of lhs op rhs, None if it isn't known. Raises ValueError for a sum or
+# difference of quantities with different dimensions.
+def _combine_dimensions(op, lhs, rhs):
+	if op in '+-':
+		if not _dimensions_compatible(lhs, rhs):
+			raise ValueError("Can't add or subtract quantities with different dimensions")
+		return lhs if lhs != DIMENSIONLESS else rhs
+
+	if lhs is None or rhs is None:
+		return None
+	sign = 1 if op == '*' else -1
+	return tuple(a + sign * b for a, b in zip(lhs, rhs))
+
+def _find_named(obj_name, subsystem):
+	for index in (subsystem._children_by_name, subsystem._remotes_by_name):
+		for obj in index.get(obj_name, ()) if index else ():
+			if obj.design is not None:
+				return obj
+
+	return None
+
+def _find_property(obj_name, prop, subsystem):
+	obj = _find_named(obj_name, subsystem)
+	if obj is None:
+		raise VerificationException("Can't find named object '{}' looking for property '{}'".format(obj_name, prop))
+	if prop not in obj.design.properties:
+		raise VerificationException("Can't find property '{}' in named object '{}'".format(prop, obj_name))
+
+	val = obj.design.get_property(prop)
+	instrumentation = subsystem._context.instrumentation
+	if instrumentation is not None:
+		instrumentation.remote(obj_name, prop, val)
+	return val
+
+def _verify_parameter(actual, operation, literal, dimension=None):
+	act = _normalise_property(actual)
+
+	if isinstance(literal, basestring):
+		lit, literal_dimension = _parse_literal(literal)
+		if not _dimensions_compatible(dimension, literal_dimension):
+			raise VerificationException("Can't compare {} with {}: the units have different dimensions".format(actual, literal))
+	else:
+		lit = literal
 
 	if operation == "eq":		return act == lit
 	elif operation == "lt":		return act <  lit
@@ -83,17 +221,2081 @@ def _verify_parameter(actual, operation, literal):
 	else:
 		raise VerificationException("Unknown operation {}".format(operation))
 
+# Parametric checks compiled into a flat table of (property, operation, threshold), with
+# every threshold parsed and normalised once. evaluate() reads each property once and
+# compares the whole table in one vectorised pass per operation rather than going through
+# _verify_parameter a requirement at a time. Requirements that can't be compiled (no
+# design to check, a threshold that isn't a number or has the wrong dimension) are left
+# out, to be checked one at a time as before.
+_check_operations = ('eq', 'lt', 'lte', 'gt', 'gte')
+
+class CheckTable(object):
+	def __init__(self, requirements):
+		self.requirements = []
+		self.keys = []
+		self.operations = []
+		self.thresholds = []
+
+		for requirement in requirements:
+			key = _checked_property(requirement)
+			if key is None or requirement.parameter[1] not in _check_operations:
+				continue
+
+			literal = requirement.parameter[2]
+			if isinstance(literal, basestring):
+				try:
+					threshold, dimension = _parse_literal(literal)
+				except VerificationException:
+					continue
+				try:
+					if not _dimensions_compatible(key[0].dimension_of(key[1]), dimension):
+						continue
+				except VerificationException:
+					continue
+			else:
+				threshold = literal
+			if not isinstance(threshold, (bool, int, long, float)):
+				continue
+
+			self.requirements.append(requirement)
+			self.keys.append(key)
+			self.operations.append(_check_operations.index(requirement.parameter[1]))
+			self.thresholds.append(float(threshold))
+
+		self._operations = None
+		self._thresholds = None
+
+	def __len__(self):
+		return len(self.requirements)
+
+	# Returns (actual values, passed) with an entry for each requirement in the table. A
+	# requirement whose property can't be evaluated, or whose value can't be compared,
+	# has a value of None and passed of None.
+	def evaluate(self):
+		values = {}
+		actual = []
+		for key in self.keys:
+			try:
+				value = values[key]
+			except KeyError:
+				try:
+					value = key[0].get_property(key[1])
+				except VerificationException:
+					value = None
+				values[key] = value
+			actual.append(value)
+
+		passed = [None] * len(actual)
+		rows = []
+		numbers = []
+		for i, value in enumerate(actual):
+			if isinstance(value, Uncertain):
+				value = value.nominal
+			elif isinstance(value, basestring):
+				try:
+					value = _parse_literal(value)[0]
+				except VerificationException:
+					continue
+			if isinstance(value, (bool, int, long, float)):
+				rows.append(i)
+				numbers.append(value)
+
+		if len(rows) >= _vector_threshold and _numpy() is not None:
+			if self._operations is None:
+				self._operations = np.array(self.operations, dtype=np.int8)
+				self._thresholds = np.array(self.thresholds)
+			operations = self._operations[rows]
+			thresholds = self._thresholds[rows]
+			numbers = np.array(numbers, dtype=float)
+			result = np.empty(len(rows), dtype=bool)
+			for code, operation in enumerate(_check_operations):
+				mask = operations == code
+				result[mask] = _comparisons[operation](numbers[mask], thresholds[mask])
+			result = result.tolist()
+		else:
+			comparisons = [_comparisons[operation] for operation in _check_operations]
+			result = [comparisons[self.operations[i]](number, self.thresholds[i]) for i, number in zip(rows, numbers)]
+
+		for i, ok in zip(rows, result):
+			passed[i] = ok
+		return actual, passed
+
+	# The requirements that fail, without building any results
+	def failures(self):
+		actual, passed = self.evaluate()
+		return [requirement for requirement, ok in zip(self.requirements, passed) if ok is False]
+
+	# The result each requirement's check would give, as {requirement: result}
+	def results(self):
+		actual, passed = self.evaluate()
+		return dict((requirement, _parametric_result(requirement, value, ok))
+			for requirement, value, ok in zip(self.requirements, actual, passed) if ok is not None)
+
+def _parametric_result(requirement, actual_value, passed):
+	operation, literal = requirement.parameter[1:]
+
+	if isinstance(actual_value, Uncertain):
+		probability = _pass_probability(actual_value, operation, literal)
+		severity = VerificationResult.INFO if passed else VerificationResult.ERROR
+		return VerificationResult(requirement, severity, "Requirement {}: {} {} {} (pass probability {:.1%})",
+			"passed" if passed else "failed", actual_value, operation, literal, probability)
+	elif passed:
+		return VerificationResult(requirement, VerificationResult.INFO, "Requirement passed: {} {} {}", actual_value, operation, literal)
+	else:
+		return VerificationResult(requirement, VerificationResult.ERROR, "Requirement failed: {} {} {}", actual_value, operation, literal)
+
+# Checks a batch of requirements through a CheckTable, storing each one's checks in the
+# property cache just as Requirement._checks() would and returning them as
+# {requirement: checks}. Returns None when it isn't worth it: for a handful of
+# requirements, or when instrumentation is timing each check.
+def _check_requirements(requirements, incremental):
+	if len(requirements) < _vector_threshold:
+		return None
+
+	context = requirements[0]._context
+	if context.instrumentation is not None:
+		return None
+
+	# Derived requirements can turn up under several allocated parents
+	cache = context.cache
+	unique = []
+	seen = set()
+	for requirement in requirements:
+		if requirement not in seen and not (incremental and requirement in cache.values):
+			seen.add(requirement)
+			unique.append(requirement)
+
+	table = CheckTable(unique)
+	checked = {}
+	for requirement, result in table.results().iteritems():
+		checks = checked[requirement] = [result]
+		cache.store_derived(requirement, checks, [_checked_property(requirement)], [requirement, requirement.allocated_to])
+	return checked
+
+
+# Tolerances. A literal such as "12mm +/- 1cm" evaluates to an Uncertain value: a nominal
+# value with a standard uncertainty that's propagated linearly (to first order) through
+# everything derived from it. The uncertainty is kept per source, as the value's sensitivity
+# to each toleranced literal, so a source that's read twice is correlated with itself
+# rather than counted twice. Comparisons use the nominal value.
+#
+# pass_probabilities() can instead sample every toleranced literal with numpy and evaluate
+# the whole model over a batch of samples at once, properties becoming arrays of samples.
+
+class Uncertain(object):
+	__slots__ = ('nominal', 'deviations')
+
+	def __init__(self, nominal, deviations=None):
+		self.nominal = nominal
+		self.deviations = deviations if deviations is not None else {}
+
+	@property
+	def std_dev(self):
+		return math.sqrt(sum(d * d for d in self.deviations.itervalues()))
+
+	def __str__(self):
+		return "{} +/- {}".format(self.nominal, self.std_dev)
+
+	def __repr__(self):
+		return "Uncertain({!r}, {!r})".format(self.nominal, self.std_dev)
+
+	def __float__(self):
+		return float(self.nominal)
+
+	# The result of an operation with nominal value 'nominal' and partial derivatives a and b
+	# with respect to self and other
+	def _propagate(self, other, nominal, a, b):
+		deviations = dict((source, a * d) for source, d in self.deviations.iteritems())
+		for source, d in other.deviations.iteritems():
+			deviations[source] = deviations.get(source, 0.0) + b * d
+		return Uncertain(nominal, deviations)
+
+	def __add__(self, other):
+		other = _uncertain(other)
+		return self._propagate(other, self.nominal + other.nominal, 1.0, 1.0)
+
+	def __sub__(self, other):
+		other = _uncertain(other)
+		return self._propagate(other, self.nominal - other.nominal, 1.0, -1.0)
+
+	def __mul__(self, other):
+		other = _uncertain(other)
+		return self._propagate(other, self.nominal * other.nominal, other.nominal, self.nominal)
+
+	def __truediv__(self, other):
+		other = _uncertain(other)
+		return self._propagate(other, self.nominal / other.nominal, 1.0 / other.nominal, -self.nominal / other.nominal ** 2)
+
+	def __radd__(self, other):
+		return _uncertain(other) + self
+
+	def __rsub__(self, other):
+		return _uncertain(other) - self
+
+	def __rmul__(self, other):
+		return _uncertain(other) * self
+
+	def __rtruediv__(self, other):
+		return _uncertain(other) / self
+
+	__div__ = __truediv__
+	__rdiv__ = __rtruediv__
+
+	def __neg__(self):
+		return Uncertain(-self.nominal, dict((source, -d) for source, d in self.deviations.iteritems()))
+
+	def __eq__(self, other):	return self.nominal == _nominal(other)
+	def __ne__(self, other):	return self.nominal != _nominal(other)
+	def __lt__(self, other):	return self.nominal <  _nominal(other)
+	def __le__(self, other):	return self.nominal <= _nominal(other)
+	def __gt__(self, other):	return self.nominal >  _nominal(other)
+	def __ge__(self, other):	return self.nominal >= _nominal(other)
+
+	__hash__ = object.__hash__
+
+def _uncertain(value):
+	return value if isinstance(value, Uncertain) else Uncertain(value)
+
+def _nominal(value):
+	return value.nominal if isinstance(value, Uncertain) else value
+
+def _normal_cdf(x):
+	return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+_comparisons = {
+	'eq'	: operator.eq,
+	'lt'	: operator.lt,
+	'lte'	: operator.le,
+	'gt'	: operator.gt,
+	'gte'	: operator.ge,
+}
+
+# The probability that a parametric check passes, given an actual value that's a plain value,
+# an Uncertain value (assumed normally distributed) or an array of samples
+def _pass_probability(actual, operation, literal):
+	if np is not None and isinstance(actual, np.ndarray):
+		return float(np.mean(_comparisons[operation](actual, _normalise_property(literal))))
+
+	if isinstance(actual, Uncertain) and operation != 'eq':
+		sigma = actual.std_dev
+		if sigma > 0:
+			below = _normal_cdf((_normalise_property(literal) - actual.nominal) / sigma)
+			return below if operation in ('lt', 'lte') else 1.0 - below
+
+	return 1.0 if _verify_parameter(actual, operation, literal) else 0.0
+
+# Batched evaluation: every property evaluates to an array holding one value per sample or
+# per variant, in a property cache of its own primed with any overridden values, so the
+# model's cached values are left alone. When sampling, toleranced literals evaluate to
+# arrays of draws; otherwise to their nominal values.
+_batch_size = 8192
+
+class _Batch(object):
+	def __init__(self, size, random=None):
+		self.size = size
+		self.random = random
+
+def _evaluate_batch(context, keys, size, random=None, overrides={}):
+	cache = context.cache
+	context.cache = PropertyCache()
+	context.batch = _Batch(size, random)
+	try:
+		for key, values in overrides.iteritems():
+			context.cache.store(key, values)
+
+		with np.errstate(divide='ignore', invalid='ignore'):
+			for design, prop in evaluation_order(keys):
+				design.get_property(prop)
+			return [design.get_property(prop) for design, prop in keys]
+	finally:
+		context.cache = cache
+		context.batch = None
+
+def _parametric(requirements):
+	checks = [requirement for requirement in requirements if requirement.parameter is not None
+		and requirement.allocated_to is not None and requirement.allocated_to.design is not None]
+	return checks, [(requirement.allocated_to.design, requirement.parameter[0]) for requirement in checks]
+
+# Pass probabilities for parametric requirements, as {requirement: probability}. Without
+# samples these come from linear propagation, assuming normal distributions. With samples,
+# every toleranced literal is drawn that many times and the model evaluated over a batch of
+# draws at a time.
+def pass_probabilities(requirements, samples=None, seed=None):
+	checks, keys = _parametric(requirements)
+
+	if samples is None:
+		return dict((requirement, _pass_probability(design.get_property(prop), *requirement.parameter[1:]))
+			for requirement, (design, prop) in zip(checks, keys))
+
+	if _numpy() is None:
+		raise OperationException("Sampling tolerances requires numpy")
+
+	random = np.random.RandomState(seed)
+	passes = dict.fromkeys(checks, 0.0)
+	context = checks[0]._context if checks else None
+
+	for start in range(0, samples if checks else 0, _batch_size):
+		count = min(_batch_size, samples - start)
+		for requirement, actual in zip(checks, _evaluate_batch(context, keys, count, random)):
+			passes[requirement] += _pass_probability(actual, *requirement.parameter[1:]) * count
+
+	return dict((requirement, passes[requirement] / samples) for requirement in checks)
+
+
+# Design-space sweeps evaluate parametric requirements over a table of variants in batches,
+# rather than editing designs and re-verifying once per variant. A table maps properties,
+# as "subsystem.property", (subsystem, property) or (design, property), to a column of
+# values with one entry per variant; full_factorial() builds one from a few axes.
+
+class SweepResult(object):
+	def __init__(self, table, requirements, passed, values):
+		self.table = table
+		self.requirements = requirements
+		self.passed = passed
+		self.values = values
+
+	def __len__(self):
+		return len(self.passed)
+
+	def variant(self, i):
+		return dict((key, column[i]) for key, column in self.table.iteritems())
+
+	# Indices of the variants that pass every requirement
+	def passing(self):
+		return np.flatnonzero(self.passed.all(axis=1))
+
+def _column(key, values):
+	design, prop = key
+	dimension = design.dimension_of(prop)
+	column = []
+
+	for value in values:
+		if isinstance(value, basestring):
+			parsed, value_dimension = _parse_literal(value)
+			if not _dimensions_compatible(dimension, value_dimension):
+				raise VerificationException("Variant '{}' for {}.{} has the wrong dimension".format(value, design.name, prop))
+			value = parsed
+		column.append(value)
+
+	return np.array(column)
+
+def full_factorial(axes, context=None):
+	if _numpy() is None:
+		raise OperationException("Design-space sweeps require numpy")
+
+	index = (context or current_context()).traceability
+	keys = [index._key(ref) for ref in axes]
+	columns = [_column(key, values) for key, values in zip(keys, axes.itervalues())]
+	grids = np.meshgrid(*columns, indexing='ij')
+	return dict((key, grid.ravel()) for key, grid in zip(keys, grids))
+
+# Evaluates every parametric requirement, and any extra properties asked for, against every
+# variant in the table. The result's passed is a boolean matrix of variants by
+# requirements, and values maps each extra property to its column of values. Names in the
+# table are looked up in the requirements' model context.
+def sweep(requirements, table, properties=()):
+	if _numpy() is None:
+		raise OperationException("Design-space sweeps require numpy")
+
+	requirements = list(requirements)
+	context = requirements[0]._context if requirements else current_context()
+	index = context.traceability
+	table = dict((index._key(ref), values) for ref, values in table.iteritems())
+	table = dict((key, _column(key, values)) for key, values in table.iteritems())
+	sizes = set(len(column) for column in table.itervalues())
+	if len(sizes) != 1:
+		raise OperationException("Every column in a sweep table needs the same number of variants")
+	size = sizes.pop()
+
+	checks, keys = _parametric(requirements)
+	properties = [index._key(ref) for ref in properties]
+	passed = np.zeros((size, len(checks)), dtype=bool)
+	values = dict((key, []) for key in properties)
+
+	for start in range(0, size, _batch_size):
+		end = min(start + _batch_size, size)
+		overrides = dict((key, column[start:end]) for key, column in table.iteritems())
+		results = _evaluate_batch(context, keys + properties, end - start, overrides=overrides)
+
+		for i, (requirement, actual) in enumerate(zip(checks, results)):
+			operation, literal = requirement.parameter[1:]
+			passed[start:end, i] = _comparisons[operation](actual, _normalise_property(literal))
+		for key, value in zip(properties, results[len(checks):]):
+			values[key].append(np.broadcast_to(value, (end - start,)))
+
+	values = dict((key, np.concatenate(columns)) for key, columns in values.iteritems())
+	return SweepResult(table, checks, passed, values)
+
+
+# Property expressions are parsed once, when the property is added, into a small tree of
+# nodes that each know how to evaluate themselves against the design that owns them.
+#
+#   expression := product (('+' | '-') product)*
+#   product    := tolerance (('*' | '/') tolerance)*
+#   tolerance  := unary ['+/-' unary]
+#   unary      := ('-' | '+') unary | atom
+#   atom       := number [unit] | '(' expression ')' | reference
+#
+# Numbers and units are scanned exactly as in a literal (see _parse_literal), so anything
+# that's a valid literal is also valid as a term of an expression.
+#   reference  := word+ ['.' word]
+#
+# A reference is an aggregate ("max children"), a property of a named subsystem in scope
+# ("chassis.width" or "front frame length") or a property of the owning design ("width").
+#
+# Values are plain numbers in SI units. Nodes also work out the dimension of their value
+# from the dimensions of whatever they read (infer_dimension), so units are checked once
+# per property, see Design.dimension_of(), rather than carried through every operation.
+
+class ExpressionException(BigglesException): pass
+
+_expression_tokens = re.compile(r"\s*(?:({})(?:\s*({}))?|(\w+)|(\+/-|\S))".format(_number_syntax, _unit_syntax))
+
+_binary_operations = {
+	'+' : operator.add,
+	'-' : operator.sub,
+	'*' : operator.mul,
+	'/' : operator.truediv,
+}
+
+_aggregate_operations = {
+	'max'	: max,
+	'min'	: min,
+	'sum'	: sum,
+	'mean'	: lambda values: sum(values) / float(len(values)),
+	'count'	: len,
+}
+
+# Wide scopes of plain numbers are reduced with numpy when it's available
+_vector_threshold = 64
+_vector_operations = {
+	'max'	: 'max',
+	'min'	: 'min',
+	'sum'	: 'sum',
+	'mean'	: 'mean',
+}
+
+_aggregate_scopes = ('children', 'interfaces')
+
+def _tokenise(text):
+	tokens = []
+	pos = 0
+	text = text.rstrip()
+
+	while pos < len(text):
+		match = _expression_tokens.match(text, pos)
+		number, unit, word, symbol = match.groups()
+
+		if number is not None:
+			tokens.append(('number', (number, unit)))
+		elif word is not None:
+			tokens.append(('word', word))
+		else:
+			tokens.append(('symbol', symbol))
+
+		pos = match.end()
+
+	tokens.append(('end', None))
+	return tokens
+
+
+class _Parser(object):
+	def __init__(self, text):
+		self.text = text
+		self.tokens = _tokenise(text)
+		self.pos = 0
+
+	def peek(self):
+		return self.tokens[self.pos]
+
+	def next(self):
+		token = self.tokens[self.pos]
+		self.pos += 1
+		return token
+
+	def accept(self, *symbols):
+		kind, value = self.peek()
+		if kind == 'symbol' and value in symbols:
+			self.pos += 1
+			return value
+		return None
+
+	def error(self, message):
+		return ExpressionException("{} in expression '{}'".format(message, self.text))
+
+	def parse(self):
+		expression = self.expression()
+
+		if self.peek()[0] != 'end':
+			raise self.error("Unexpected '{}'".format(self.peek()[1]))
+
+		return expression
+
+	def expression(self):
+		lhs = self.product()
+
+		op = self.accept('+', '-')
+		while op is not None:
+			lhs = self.binary(op, lhs, self.product())
+			op = self.accept('+', '-')
+
+		return lhs
+
+	def product(self):
+		lhs = self.tolerance()
+
+		op = self.accept('*', '/')
+		while op is not None:
+			lhs = self.binary(op, lhs, self.tolerance())
+			op = self.accept('*', '/')
+
+		return lhs
+
+	def tolerance(self):
+		start = self.pos
+		nominal = self.unary()
+		nominal_unit = self.lone_unit(start)
+
+		if not self.accept('+/-'):
+			return nominal
+
+		start = self.pos
+		tolerance = self.unary()
+		tolerance_unit = self.lone_unit(start)
+
+		# Only one side needs a unit: "1m +/- 0.1" is +/- 0.1m, and "12 +/- 1mm" is 12mm
+		if nominal_unit and tolerance_unit is None:
+			tolerance = _Constant(tolerance.value * _lookup_unit(nominal_unit)[0], nominal.dimension)
+		elif tolerance_unit and nominal_unit is None:
+			nominal = _Constant(nominal.value * _lookup_unit(tolerance_unit)[0], tolerance.dimension)
+
+		if isinstance(nominal, _Constant) and isinstance(tolerance, _Constant):
+			if not _dimensions_compatible(nominal.dimension, tolerance.dimension):
+				raise self.error("A tolerance must have the same dimension as its value")
+		return _Tolerance(nominal, tolerance)
+
+	# The unit of a lone number parsed from start, None if it had none, or False if what was
+	# parsed wasn't a lone number
+	def lone_unit(self, start):
+		kind, value = self.tokens[start]
+		if self.pos != start + 1 or kind != 'number':
+			return False
+		return value[1] or None
+
+	def unary(self):
+		if self.accept('+'):
+			return self.unary()
+
+		if self.accept('-'):
+			operand = self.unary()
+			if isinstance(operand, _Constant):
+				return _Constant(-operand.value, operand.dimension)
+			return _Negation(operand)
+
+		return self.atom()
+
+	# Arithmetic on literals is done here, once, which is also where mismatched units in
+	# literals get caught
+	def binary(self, op, lhs, rhs):
+		if not (isinstance(lhs, _Constant) and isinstance(rhs, _Constant)):
+			return _BinaryOperation(op, lhs, rhs)
+
+		try:
+			dimension = _combine_dimensions(op, lhs.dimension, rhs.dimension)
+		except ValueError as e:
+			raise self.error(str(e))
+
+		try:
+			value = _binary_operations[op](lhs.value, rhs.value)
+		except ZeroDivisionError:
+			raise self.error("Division by zero")
+		return _Constant(value, dimension)
+
+	def atom(self):
+		kind, value = self.peek()
+
+		if kind == 'number':
+			self.next()
+			number, unit = value
+			if unit is None:
+				return _Constant(float(number), DIMENSIONLESS)
+
+			try:
+				scale, dimension = _lookup_unit(unit)
+			except KeyError:
+				raise self.error("Unknown unit '{}'".format(unit))
+			return _Constant(float(number) * scale, dimension)
+
+		if self.accept('('):
+			expression = self.expression()
+			if not self.accept(')'):
+				raise self.error("Missing ')'")
+			return expression
+
+		if kind == 'word':
+			return self.reference()
+
+		if kind == 'end':
+			raise self.error("Unexpected end")
+
+		raise self.error("Unexpected '{}'".format(value))
+
+	def reference(self):
+		words = []
+		while self.peek()[0] == 'word':
+			words.append(self.next()[1])
+
+		if self.accept('.'):
+			kind, prop = self.next()
+			if kind != 'word':
+				raise self.error("Expected a property name after '{}.'".format(' '.join(words)))
+			return _RemoteProperty(' '.join(words), prop)
+
+		if len(words) == 1:
+			if words[0].lower() in ('true', 'false'):
+				return _Constant(words[0].lower() == 'true')
+			return _OwnProperty(words[0])
+
+		if len(words) == 2 and words[0] in _aggregate_operations:
+			if words[1] not in _aggregate_scopes:
+				raise self.error("Unknown dynamic property scope '{}'".format(words[1]))
+			return _Aggregate(words[0], words[1])
+
+		return _RemoteProperty(' '.join(words[:-1]), words[-1])
+
+
+class _Constant(object):
+	__slots__ = ('value', 'dimension')
+
+	def __init__(self, value, dimension=None):
+		self.value = value
+		self.dimension = dimension
+
+	def evaluate(self, design, prop):
+		return self.value
+
+	def references(self, design, prop):
+		return []
+
+	def infer_dimension(self, design, prop):
+		return self.dimension
+
+
+class _Tolerance(object):
+	__slots__ = ('nominal', 'tolerance', 'dimension')
+
+	def __init__(self, nominal, tolerance):
+		self.nominal = nominal
+		self.tolerance = tolerance
+		self.dimension = nominal.dimension if isinstance(nominal, _Constant) else None
+
+	# Each toleranced literal in each design is its own source of uncertainty
+	def evaluate(self, design, prop):
+		nominal = self.nominal.evaluate(design, prop)
+		tolerance = abs(float(_nominal(self.tolerance.evaluate(design, prop))))
+
+		batch = design._context.batch
+		if batch is not None:
+			if batch.random is None:
+				return nominal
+			return nominal + tolerance * batch.random.standard_normal(batch.size)
+		return nominal + Uncertain(0.0, {(design, prop, self): tolerance})
+
+	def references(self, design, prop):
+		return self.nominal.references(design, prop) + self.tolerance.references(design, prop)
+
+	def infer_dimension(self, design, prop):
+		nominal = self.nominal.infer_dimension(design, prop)
+		if not _dimensions_compatible(nominal, self.tolerance.infer_dimension(design, prop)):
+			raise VerificationException("A tolerance must have the same dimension as its value in {}.{}".format(design.name, prop))
+		return nominal
+
+
+class _OwnProperty(object):
+	__slots__ = ('name',)
+
+	def __init__(self, name):
+		self.name = name
+
+	# A word that isn't one of the design's properties is most likely a typo, so it's an
+	# error rather than a missing value
+	def evaluate(self, design, prop):
+		if self.name not in design.properties:
+			raise VerificationException("Can't interpret property '{}' in {}.{}: the design has no property of that name".format(
+				self.name, design.name, prop))
+		return design.get_property(self.name)
+
+	def references(self, design, prop):
+		return [(design, self.name)]
+
+	def infer_dimension(self, design, prop):
+		return design.dimension_of(self.name)
+
+
+class _RemoteProperty(object):
+	__slots__ = ('obj_name', 'name')
+
+	def __init__(self, obj_name, name):
+		self.obj_name = obj_name
+		self.name = name
+
+	def evaluate(self, design, prop):
+		return _find_property(self.obj_name, self.name, design.subsystem)
+
+	def references(self, design, prop):
+		obj = _find_named(self.obj_name, design.subsystem) if design.subsystem is not None else None
+		return [(obj.design, self.name)] if obj is not None else []
+
+	def infer_dimension(self, design, prop):
+		obj = _find_named(self.obj_name, design.subsystem) if design.subsystem is not None else None
+		return obj.design.dimension_of(self.name) if obj is not None else None
+
+
+class _Aggregate(object):
+	__slots__ = ('operation', 'scope')
+
+	def __init__(self, operation, scope):
+		self.operation = operation
+		self.scope = scope
+
+	def members(self, design):
+		if self.scope == 'children':
+			return design.subsystem.children
+		else:
+			return design.subsystem._neighbours or ()
+
+	def evaluate(self, design, prop):
+		context = design._context
+		if context.batch is None and context.instrumentation is None:
+			value = context.columns.reduce(design.subsystem, self.scope, prop, self.operation)
+			if value is not None:
+				return value
+
+		scope = self.members(design)
+
+		props = []
+		numeric = True
+		for obj in scope:
+			if obj.design is not None:
+				value = obj.design.get_property(prop)
+				if value is not None:
+					props.append(value)
+					numeric = numeric and isinstance(value, float)
+
+		if not len(props):
+			raise VerificationException("Can't find property '{}' in any objects in scope '{}'".format(prop, self.scope))
+
+		# Arrays of samples or variants are reduced element by element
+		if not numeric and design._context.batch is not None and self.operation in _vector_operations:
+			return getattr(np, _vector_operations[self.operation])(np.array(np.broadcast_arrays(*props)), axis=0)
+
+		if numeric and len(props) >= _vector_threshold and self.operation in _vector_operations and _numpy() is not None:
+			return float(getattr(np, _vector_operations[self.operation])(np.array(props)))
+
+		return _aggregate_operations[self.operation](props)
+
+	def references(self, design, prop):
+		if design.subsystem is None:
+			return []
+		return [(obj.design, prop) for obj in self.members(design) if obj.design is not None]
+
+	# Members whose dimension isn't known are left out, as are plain numbers once anything
+	# has units
+	def infer_dimension(self, design, prop):
+		if self.operation == 'count':
+			return DIMENSIONLESS
+		if design.subsystem is None:
+			return None
+
+		members = design._context.columns.member_dimensions(design.subsystem, self.scope, prop)
+		if members is None:
+			members = (obj.design.dimension_of(prop) for obj in self.members(design) if obj.design is not None)
+
+		dimension = None
+		for member in members:
+			if not _dimensions_compatible(dimension, member):
+				raise VerificationException("Can't {} '{}' over the {} of {}: the units have different dimensions".format(
+					self.operation, prop, self.scope, design.name))
+			if dimension is None or dimension == DIMENSIONLESS:
+				dimension = member
+		return dimension
+
+
+class _BinaryOperation(object):
+	__slots__ = ('op', 'function', 'lhs', 'rhs')
+
+	def __init__(self, op, lhs, rhs):
+		self.op = op
+		self.function = _binary_operations[op]
+		self.lhs = lhs
+		self.rhs = rhs
+
+	def evaluate(self, design, prop):
+		return self.function(self.lhs.evaluate(design, prop), self.rhs.evaluate(design, prop))
+
+	def references(self, design, prop):
+		return self.lhs.references(design, prop) + self.rhs.references(design, prop)
+
+	def infer_dimension(self, design, prop):
+		try:
+			return _combine_dimensions(self.op, self.lhs.infer_dimension(design, prop), self.rhs.infer_dimension(design, prop))
+		except ValueError as e:
+			raise VerificationException("{} in {}.{}".format(e, design.name, prop))
+
+
+class _Negation(object):
+	__slots__ = ('operand',)
+
+	def __init__(self, operand):
+		self.operand = operand
+
+	def evaluate(self, design, prop):
+		return -self.operand.evaluate(design, prop)
+
+	def references(self, design, prop):
+		return self.operand.references(design, prop)
+
+	def infer_dimension(self, design, prop):
+		return self.operand.infer_dimension(design, prop)
+
+
+# Strings that can't be parsed only complain when something actually asks for their value
+class _Unparseable(object):
+	__slots__ = ('text', 'error')
+
+	def __init__(self, text, error):
+		self.text = text
+		self.error = error
+
+	def evaluate(self, design, prop):
+		raise VerificationException("Can't interpret property string '{}' for design '{}': {}".format(self.text, design, self.error))
+
+	def references(self, design, prop):
+		return []
+
+	def infer_dimension(self, design, prop):
+		return None
+
+
+# Compiled expressions don't change once built, so every design using the same string
+# shares one. The cache is approximately least-recently-used: new entries go into a young
+# generation, which becomes the old one when it fills. Anything looked up from the old
+# generation is promoted back, and whatever's left there is dropped at the next turnover.
+class _ExpressionCache(object):
+	def __init__(self, size):
+		self.size = size
+		self.young = {}
+		self.old = {}
+
+	def get(self, source):
+		try:
+			return self.young[source]
+		except KeyError:
+			expression = self.old.pop(source)
+			self.store(source, expression)
+			return expression
+
+	def store(self, source, expression):
+		if len(self.young) >= self.size // 2:
+			self.old = self.young
+			self.young = {}
+		self.young[source] = expression
+
+	def clear(self):
+		self.young.clear()
+		self.old.clear()
+
+_expression_cache = _ExpressionCache(65536)
+
+def compile_expression(value):
+	if not isinstance(value, basestring):
+		return _Constant(value)
+
+	try:
+		return _expression_cache.get(value)
+	except KeyError:
+		pass
+
+	try:
+		expression = _Constant(*_parse_literal(value))
+	except VerificationException:
+		try:
+			expression = _Parser(value).parse()
+		except ExpressionException as e:
+			expression = _Unparseable(value, e)
+
+	_expression_cache.store(value, expression)
+	return expression
+
+
+
+# Memoises (design, property) values. While a value is being computed, every other cached
+# key it reads is recorded so that an edit only throws away the values downstream of it.
+# Structural reads (a design's subsystem, a subsystem's children/interfaces/designs) are
+# tracked against the object whose structure was read.
+class PropertyCache(object):
+	def __init__(self):
+		self.values = {}
+		self.dependents = {}
+		self.structure_dependents = {}
+		self._computing = []
+		self._in_progress = set()
+
+		# Inferred dimensions, by key, with what each was inferred from tracked the same way
+		# as values. An edit that leaves a constant's dimension alone keeps them all.
+		self.dimensions = {}
+		self.dimension_dependents = {}
+		self.dimension_structure_dependents = {}
+
+		# Content keys for the persistent verification cache (see _ContentKeys), tracked the
+		# same way again. They only depend on what's in the model, like the columns do, so
+		# clear() keeps them and a later run only works out keys for what's been edited.
+		self.content_keys = {}
+		self.content_dependents = {}
+		self.content_structure_dependents = {}
+
+	def lookup(self, key):
+		self.read(key)
+		return self.values[key]
+
+	def read(self, key):
+		if self._computing:
+			self.dependents.setdefault(key, set()).add(self._computing[-1])
+
+	def read_structure(self, obj):
+		if self._computing:
+			self.structure_dependents.setdefault(obj, set()).add(self._computing[-1])
+
+	def begin(self, key):
+		self._computing.append(key)
+		self._in_progress.add(key)
+
+	def end(self, key):
+		self._computing.pop()
+		self._in_progress.discard(key)
+
+	def in_progress(self, key):
+		return key in self._in_progress
+
+	def store(self, key, value):
+		self.values[key] = value
+
+	def store_derived(self, key, value, reads, structures):
+		for read in reads:
+			self.dependents.setdefault(read, set()).add(key)
+		for obj in structures:
+			self.structure_dependents.setdefault(obj, set()).add(key)
+		self.values[key] = value
+
+	def store_dimension(self, key, dimension, reads, structures):
+		for read in reads:
+			self.dimension_dependents.setdefault(read, set()).add(key)
+		for obj in structures:
+			self.dimension_structure_dependents.setdefault(obj, set()).add(key)
+		self.dimensions[key] = dimension
+
+	def store_content_key(self, key, content, reads, structures):
+		for read in reads:
+			self.content_dependents.setdefault(read, set()).add(key)
+		for obj in structures:
+			self.content_structure_dependents.setdefault(obj, set()).add(key)
+		self.content_keys[key] = content
+
+	def _invalidate_values(self, key):
+		stack = [key]
+		while stack:
+			key = stack.pop()
+			self.values.pop(key, None)
+			stack.extend(self.dependents.pop(key, ()))
+
+	def _invalidate_dimensions(self, key):
+		stack = [key]
+		while stack:
+			key = stack.pop()
+			self.dimensions.pop(key, None)
+			stack.extend(self.dimension_dependents.pop(key, ()))
+
+	def _invalidate_content_keys(self, key):
+		stack = [key]
+		while stack:
+			key = stack.pop()
+			self.content_keys.pop(key, None)
+			stack.extend(self.content_dependents.pop(key, ()))
+
+	def invalidate(self, key, dimensions=True):
+		self._invalidate_values(key)
+		self._invalidate_content_keys(key)
+		if dimensions:
+			self._invalidate_dimensions(key)
+
+	def invalidate_structure(self, obj, dimensions=True):
+		for key in self.structure_dependents.pop(obj, ()):
+			self._invalidate_values(key)
+		self.invalidate_content(obj)
+		if dimensions:
+			for key in self.dimension_structure_dependents.pop(obj, ()):
+				self._invalidate_dimensions(key)
+
+	# For edits that change what a subsystem's results are keyed by, but not any values
+	def invalidate_content(self, obj):
+		for key in self.content_structure_dependents.pop(obj, ()):
+			self._invalidate_content_keys(key)
+
+	def clear(self):
+		self.values.clear()
+		self.dependents.clear()
+		self.structure_dependents.clear()
+		self.dimensions.clear()
+		self.dimension_dependents.clear()
+		self.dimension_structure_dependents.clear()
+
+
+
+# Property dependency graphs. Properties are normally evaluated on demand, each one recursing
+# into the properties it reads. evaluation_order() walks the references of every expression
+# up front instead, which finds circular definitions before anything is evaluated and gives
+# an order in which each property only reads values that are already cached.
+
+class CircularDefinitionException(VerificationException): pass
+
+# Past this many nested evaluations get_property() orders the remaining dependencies first
+# rather than recursing any deeper
+_recursion_budget = 100
+
+def _format_path(keys):
+	return " -> ".join("{}.{}".format(design.name, prop) for design, prop in keys)
+
+# Every key a property reads, whether or not it's cached
+def _references(key):
+	design, prop = key
+	expression = design._expressions.get(prop)
+	if expression is None or design.subsystem is None:
+		return []
+	return expression.references(design, prop)
+
+def _dependencies(key):
+	if key in key[0]._context.cache.values:
+		return ()
+	return _references(key)
+
+# Every key's dependencies come before it; keys that are already cached aren't looked into
+def evaluation_order(keys):
+	order = []
+	finished = {}
+
+	for root in keys:
+		if root in finished:
+			continue
+
+		finished[root] = False
+		stack = [(root, iter(_dependencies(root)))]
+		while stack:
+			key, dependencies = stack[-1]
+			for dependency in dependencies:
+				state = finished.get(dependency)
+				if state is None:
+					finished[dependency] = False
+					stack.append((dependency, iter(_dependencies(dependency))))
+					break
+				elif state is False:
+					path = [k for k, _ in stack]
+					path = path[path.index(dependency):] + [dependency]
+					raise CircularDefinitionException("Circular definition: {}".format(_format_path(path)))
+			else:
+				stack.pop()
+				finished[key] = True
+				order.append(key)
+
+	return order
+
+# Infers the dimension of a property after those of everything it reads, without recursing,
+# and remembers each one in the property cache along with what it was inferred from. A
+# VerificationException is remembered in place of the dimension of a property that mixes
+# units, and of anything reading it. Properties on a circular definition read each other as
+# unknown.
+def _infer_dimensions(key, cache):
+	dimensions = cache.dimensions
+	pending = set()
+	stack = [key]
+	while stack:
+		current = stack[-1]
+		if current in dimensions:
+			stack.pop()
+			continue
+
+		# Literals know their dimension already, and wide aggregates know those of their members
+		design, prop = current
+		expression = design._expressions.get(prop)
+		reads, structures = _dimension_reads(current)
+		references = [reference for reference in reads
+			if reference not in dimensions and not isinstance(reference[0]._expressions.get(reference[1]), _Constant)]
+		if current not in pending:
+			pending.add(current)
+			stack.extend(reference for reference in references if reference not in pending)
+			continue
+
+		stack.pop()
+		pending.discard(current)
+		for reference in references:
+			if reference in pending:
+				cache.store_dimension(reference, None, *_dimension_reads(reference))
+
+		try:
+			dimension = expression.infer_dimension(design, prop) if expression is not None else None
+		except VerificationException as e:
+			dimension = e
+		cache.store_dimension(current, dimension, reads, structures)
+
+	return dimensions[key]
+
+# The keys and structures a property's dimension is inferred from
+def _dimension_reads(key):
+	design, prop = key
+	structures = [design]
+	if design.subsystem is None:
+		return [], structures
+	structures.append(design.subsystem)
+
+	expression = design._expressions.get(prop)
+	if isinstance(expression, _Aggregate):
+		columns = design._context.columns
+		column = columns.column(design.subsystem, expression.scope, prop)
+		if column is not None:
+			structures.append(column)
+			return columns.derived_references(design.subsystem, expression.scope, prop), structures
+	return _references(key), structures
+
+# Evaluates every property of every design in and around a subtree, each exactly once, and
+# returns (design, property, value, error) in evaluation order. error is the
+# VerificationException raised evaluating that property, if any, in which case value is None.
+# A circular definition anywhere in the subtree is raised before anything is evaluated.
+def _designs(root):
+	designs = []
+	seen = set()
+	for subsystem in _subtree(root):
+		for obj in [subsystem] + subsystem.neighbours():
+			if obj.design is not None and obj.design not in seen:
+				seen.add(obj.design)
+				designs.append(obj.design)
+	return designs
+
+def evaluate_all(root):
+	results = []
+	for design, prop in evaluation_order([(design, prop) for design in _designs(root) for prop in design.properties]):
+		try:
+			results.append((design, prop, design.get_property(prop), None))
+		except VerificationException as e:
+			results.append((design, prop, None, e))
+
+	return results
+
+# Evaluates everything that can be evaluated, each property after what it reads. Unlike
+# evaluate_all a circular definition only stops the properties on or above it, and errors
+# are left to whatever actually reads the property to raise.
+def _prime_properties(root):
+	for design in _designs(root):
+		for prop in design.properties:
+			try:
+				for dependency, dependency_prop in evaluation_order([(design, prop)]):
+					dependency.get_property(dependency_prop)
+			except VerificationException:
+				pass
+
+
+# Instrumentation counts property lookups and cache hits, times every property evaluation
+# and requirement check, and passes each event to any hooks. Times are both inclusive and
+# self (less the properties evaluated on the way), so the slowest entries point at the
+# expressions that are actually expensive rather than everything above them.
+#
+# It's off unless an Instrumentation is enabled on a model context, either with enable() or
+# as a context manager, and then costs the hot paths a single attribute check. Only the
+# process that enabled it is instrumented; parallel verification workers aren't.
+#
+# Hooks are called as hook(event, obj, prop, value, seconds, depth) where event is one of
+# 'hit', 'evaluate', 'remote' or 'check'.
+
+class Instrumentation(object):
+	def __init__(self, hooks=(), trace=False):
+		self.hooks = list(hooks)
+		self.trace = [] if trace else None
+
+		self.lookups = 0
+		self.hits = 0
+		self.misses = 0
+		self.remote_lookups = 0
+		self.checks = 0
+		self.cached_checks = 0
+		self.max_depth = 0
+
+		self.property_time = {}
+		self.property_self_time = {}
+		self.check_time = {}
+		self._children = []
+
+	def enable(self, context=None):
+		self._context = context or current_context()
+		self._previous = self._context.instrumentation
+		self._context.instrumentation = self
+		return self
+
+	def disable(self):
+		self._context.instrumentation = self._previous
+		self._previous = self._context = None
+
+	def __enter__(self):
+		return self.enable()
+
+	def __exit__(self, *exc):
+		self.disable()
+
+	def _event(self, event, obj, prop, value=None, seconds=None, depth=None):
+		if self.trace is not None:
+			self.trace.append((event, obj, prop, value, seconds, depth))
+		for hook in self.hooks:
+			hook(event, obj, prop, value, seconds, depth)
+
+	def hit(self, design, prop, value):
+		self.lookups += 1
+		self.hits += 1
+		if self.hooks or self.trace is not None:
+			self._event('hit', design, prop, value)
+
+	def begin(self):
+		self._children.append(0.0)
+
+	def evaluated(self, design, prop, value, seconds, depth):
+		self.lookups += 1
+		self.misses += 1
+		self.max_depth = max(self.max_depth, depth)
+
+		key = (design, prop)
+		self.property_time[key] = self.property_time.get(key, 0.0) + seconds
+		self.property_self_time[key] = self.property_self_time.get(key, 0.0) + seconds - self._children.pop()
+		if self._children:
+			self._children[-1] += seconds
+
+		if self.hooks or self.trace is not None:
+			self._event('evaluate', design, prop, value, seconds, depth)
+
+	def remote(self, obj_name, prop, value):
+		self.remote_lookups += 1
+		if self.hooks or self.trace is not None:
+			self._event('remote', obj_name, prop, value)
+
+	def checked(self, requirement, seconds):
+		self.checks += 1
+		self.check_time[requirement] = self.check_time.get(requirement, 0.0) + seconds
+		if self._children:
+			self._children[-1] += seconds
+		if self.hooks or self.trace is not None:
+			self._event('check', requirement, None, None, seconds)
+
+	def cached_check(self, requirement):
+		self.cached_checks += 1
+
+	def slowest_properties(self, count=10, self_time=True):
+		times = self.property_self_time if self_time else self.property_time
+		return sorted(times.iteritems(), key=operator.itemgetter(1), reverse=True)[:count]
+
+	def slowest_requirements(self, count=10):
+		return sorted(self.check_time.iteritems(), key=operator.itemgetter(1), reverse=True)[:count]
+
+	def summary(self, count=10):
+		lines = [
+			"{} property lookups: {} cache hits, {} evaluated, {} through dotted references".format(
+				self.lookups, self.hits, self.misses, self.remote_lookups),
+			"Deepest resolution: {} levels".format(self.max_depth),
+			"{} requirement checks, {} from cache".format(self.checks + self.cached_checks, self.cached_checks),
+		]
+
+		if self.property_self_time:
+			lines.append("Slowest properties (self time):")
+			for (design, prop), seconds in self.slowest_properties(count):
+				lines.append("  {:10.6f}s  {}.{}".format(seconds, design.name, prop))
+
+		if self.check_time:
+			lines.append("Slowest requirements:")
+			for requirement, seconds in self.slowest_requirements(count):
+				lines.append("  {:10.6f}s  {}".format(seconds, requirement))
+
+		return "\n".join(lines)
+
+	# One tab-separated line per event: event, object, property, value, seconds, depth
+	def write_trace(self, path):
+		if self.trace is None:
+			raise OperationException("Instrumentation wasn't created with trace=True")
+
+		with open(path, 'w') as f:
+			for event, obj, prop, value, seconds, depth in self.trace:
+				name = getattr(obj, 'name', obj)
+				f.write("\t".join("" if field is None else str(field) for field in (event, name, prop, value, seconds, depth)) + "\n")
+
+
+# Property columns. "<op> children" and "<op> interfaces" over a wide scope read their
+# members' values from a numpy column per (subsystem, scope, property) rather than calling
+# get_property on every member. A column holds the value of each member whose property is a
+# plain number, NaN for those without it, and notes which members have a derived value;
+# only those are evaluated when the aggregate is, the rest being reduced in one go.
+#
+# Columns are built the first time an aggregate needs one and then kept up to date: slots
+# are rewritten as properties are added and designs linked, and grown as members are. An
+# aggregate depends on its column as a structure, so changing a slot invalidates it. The
+# dimensions of the numbers in a column are counted as well, so inferring an aggregate's
+# dimension only has to look at its derived members.
+
+class _Column(object):
+	__slots__ = ('values', 'size', 'derived', 'slot_dimensions', 'dimensions')
+
+	def __init__(self, members, prop):
+		nan = float('nan')
+		values = []
+		self.derived = set()
+		self.slot_dimensions = []
+		self.dimensions = {}
+
+		for i, member in enumerate(members):
+			expression = member.design._expressions.get(prop) if member.design is not None else None
+			dimension = None
+			if expression is None:
+				values.append(nan)
+			elif isinstance(expression, _Constant) and type(expression.value) is float:
+				values.append(expression.value)
+				dimension = expression.dimension
+				if dimension is not None:
+					self.dimensions[dimension] = self.dimensions.get(dimension, 0) + 1
+			else:
+				values.append(nan)
+				self.derived.add(i)
+			self.slot_dimensions.append(dimension)
+
+		self.values = np.array(values, dtype=float)
+		self.size = len(values)
+
+	def grow(self):
+		if self.size == len(self.values):
+			values = np.full(2 * self.size + 16, np.nan)
+			values[:self.size] = self.values
+			self.values = values
+		self.size += 1
+		self.slot_dimensions.append(None)
+
+	# Returns whether the slot's dimension, or whether it's derived, changed
+	def set(self, i, design, prop):
+		before = (self.slot_dimensions[i], i in self.derived)
+		self.derived.discard(i)
+		dimension = self.slot_dimensions[i]
+		if dimension is not None:
+			self.dimensions[dimension] -= 1
+			if not self.dimensions[dimension]:
+				del self.dimensions[dimension]
+			self.slot_dimensions[i] = None
+		self.values[i] = np.nan
+
+		expression = design._expressions.get(prop) if design is not None else None
+		if expression is None:
+			pass
+		elif isinstance(expression, _Constant) and type(expression.value) is float:
+			self.values[i] = expression.value
+			if expression.dimension is not None:
+				self.slot_dimensions[i] = expression.dimension
+				self.dimensions[expression.dimension] = self.dimensions.get(expression.dimension, 0) + 1
+		else:
+			self.derived.add(i)
+
+		return before != (self.slot_dimensions[i], i in self.derived)
+
+
+class PropertyColumns(object):
+	def __init__(self, context):
+		self.context = context
+		self.columns = {}
+		self.positions = {}
+
+	def _members(self, subsystem, scope):
+		return subsystem.children if scope == 'children' else subsystem._neighbours or ()
+
+	# The column for a scope, or None if it's too narrow to be worth one
+	def column(self, subsystem, scope, prop):
+		columns = self.columns.get((subsystem, scope))
+		if columns is not None and prop in columns:
+			return columns[prop]
+
+		members = self._members(subsystem, scope)
+		if len(members) < _vector_threshold or _numpy() is None:
+			return None
+
+		column = _Column(members, prop)
+		self.columns.setdefault((subsystem, scope), {})[prop] = column
+		return column
+
+	def _position(self, subsystem, scope, member):
+		positions = self.positions.get((subsystem, scope))
+		if positions is None:
+			members = self._members(subsystem, scope)
+			positions = self.positions[(subsystem, scope)] = dict((m, i) for i, m in enumerate(members))
+		return positions[member]
+
+	# Every (column, slot) holding one of the subsystem's values
+	def _slots(self, subsystem):
+		owners = [(remote, 'interfaces') for remote in subsystem._neighbours or ()]
+		if subsystem.parent is not None:
+			owners.append((subsystem.parent, 'children'))
+
+		for owner in owners:
+			columns = self.columns.get(owner)
+			if columns:
+				i = self._position(owner[0], owner[1], subsystem)
+				for prop, column in columns.iteritems():
+					yield prop, column, i
+
+	# Edit notifications
+
+	def property_changed(self, design, prop):
+		if not self.columns or design.subsystem is None:
+			return
+		for column_prop, column, i in self._slots(design.subsystem):
+			if column_prop == prop:
+				dimension_changed = column.set(i, design, prop)
+				self.context.cache.invalidate_structure(column, dimension_changed)
+
+	def design_linked(self, *subsystems):
+		if not self.columns:
+			return
+		for subsystem in subsystems:
+			if subsystem is not None:
+				for prop, column, i in self._slots(subsystem):
+					dimension_changed = column.set(i, subsystem.design, prop)
+					self.context.cache.invalidate_structure(column, dimension_changed)
+
+	def member_added(self, subsystem, scope, member):
+		columns = self.columns.get((subsystem, scope))
+		if not columns:
+			return
+
+		positions = self.positions.get((subsystem, scope))
+		if positions is not None:
+			positions[member] = len(positions)
+		for prop, column in columns.iteritems():
+			column.grow()
+			column.set(column.size - 1, member.design, prop)
+
+	# Reduces a scope through its column. Returns None if there's no column, or if a derived
+	# member isn't a plain number, leaving the aggregate to do it member by member.
+	def reduce(self, subsystem, scope, prop, operation):
+		column = self.column(subsystem, scope, prop)
+		if column is None:
+			return None
+
+		values = column.values[:column.size]
+		if column.derived:
+			values = values.copy()
+			members = self._members(subsystem, scope)
+			for i in column.derived:
+				value = members[i].design.get_property(prop)
+				if value is None:
+					continue
+				if type(value) is not float:
+					return None
+				values[i] = value
+
+		self.context.cache.read_structure(column)
+
+		values = values[~np.isnan(values)]
+		if not len(values):
+			raise VerificationException("Can't find property '{}' in any objects in scope '{}'".format(prop, scope))
+
+		# Reduced the same way as member by member, so results don't depend on the route
+		if operation == 'count':
+			return len(values)
+		if len(values) < _vector_threshold:
+			return _aggregate_operations[operation](values.tolist())
+		return float(getattr(np, _vector_operations[operation])(values))
+
+	# The dimension of each of a scope's members that has one, each number's only once, or
+	# None if there's no column
+	def member_dimensions(self, subsystem, scope, prop):
+		column = self.column(subsystem, scope, prop)
+		if column is None:
+			return None
+
+		members = self._members(subsystem, scope)
+		dimensions = list(column.dimensions)
+		dimensions.extend(members[i].design.dimension_of(prop) for i in column.derived)
+		return dimensions
+
+	# Members whose dimension isn't already known from their column
+	def derived_references(self, subsystem, scope, prop):
+		column = self.column(subsystem, scope, prop)
+		if column is None:
+			return None
+		members = self._members(subsystem, scope)
+		return [(members[i].design, prop) for i in column.derived]
+
+
+# Evaluates a property across a whole subtree, deepest first, returning {subsystem: value}
+# for every subsystem where it is defined and leaving the results in the property cache. An
+# aggregate with nothing to aggregate is left out, as is anything aggregating over it.
+def rollup(subsystem, prop):
+	values = {}
+	failed = set()
+	for sub in reversed(_subtree(subsystem)):
+		design = sub.design
+		if design is None or prop not in design.properties:
+			continue
+
+		expression = design._expressions[prop]
+		if isinstance(expression, _Aggregate) and expression.scope == 'children':
+			if not any(child in values for child in sub.children) or any(child in failed for child in sub.children):
+				failed.add(sub)
+				continue
+
+		# Plain numbers needn't go through the property cache
+		if isinstance(expression, _Constant):
+			value = expression.value
+		else:
+			value = design.get_property(prop)
+		if value is not None:
+			values[sub] = value
+
+	return values
+
+# Links between requirements, what they're allocated to, the design property each
+# parametric check reads and the properties those read in turn, so impact queries only
+# touch the entries involved. Property keys are (design, property name) pairs.
+#
+# Most models are never queried, so nothing is indexed until the first query, which walks
+# the model from its parentless subsystems (the System and any Users). From then on edits
+# are tracked, but only as which designs' reads are stale; they're worked out again by the
+# next query. Requirements are indexed by parameter as they're created, since they needn't
+# be allocated to anything.
+class TraceabilityIndex(object):
+	def __init__(self):
+		self.reads = {}
+		self.read_by = {}
+		self.checks = {}
+		self.checked_by = {}
+		self.by_parameter = {}
+		self.by_allocation = {}
+		self.subsystems_by_name = {}
+		self._roots = []
+		self._built = False
+		self._stale_designs = set()
+
+	def _link(self, forward, reverse, source, targets):
+		for target in forward.pop(source, ()):
+			reverse[target].discard(source)
+		if targets:
+			forward[source] = targets
+			for target in targets:
+				reverse.setdefault(target, set()).add(source)
+
+	def _update_reads(self, design, prop):
+		expression = design._expressions.get(prop)
+		references = set(expression.references(design, prop)) if expression is not None else set()
+		self._link(self.reads, self.read_by, (design, prop), references)
+
+	def _build(self):
+		self._built = True
+
+		interfaces = set()
+		for root in self._roots:
+			for subsystem in _subtree(root):
+				self.subsystems_by_name.setdefault(subsystem.name, []).append(subsystem)
+				self.scope_changed(subsystem)
+				for requirement in subsystem.requirements:
+					self.requirement_allocated(requirement, None)
+				interfaces.update(subsystem.interfaces)
+
+		for interface in interfaces:
+			for requirement in interface.requirements:
+				self.requirement_allocated(requirement, None)
+
+	def _refresh(self):
+		if not self._built:
+			self._build()
+
+		for design in self._stale_designs:
+			for prop in design.properties:
+				self._update_reads(design, prop)
+		self._stale_designs.clear()
+
+	# Edit notifications
+
+	def property_changed(self, design, prop):
+		if self._built:
+			self._stale_designs.add(design)
+
+	def scope_changed(self, subsystem):
+		if self._built and subsystem is not None and subsystem.design is not None:
+			self._stale_designs.add(subsystem.design)
+
+	def subsystem_added(self, subsystem):
+		if subsystem.parent is None:
+			self._roots.append(subsystem)
+		if self._built:
+			self.subsystems_by_name.setdefault(subsystem.name, []).append(subsystem)
+			self.scope_changed(subsystem.parent)
+
+	def interface_added(self, interface):
+		for subsystem in interface.systems:
+			self.scope_changed(subsystem)
+
+	def design_linked(self, design, previous_subsystem, subsystem):
+		if not self._built:
+			return
+
+		for obj in (previous_subsystem, subsystem):
+			if obj is None:
+				continue
+			self.scope_changed(obj)
+			self.scope_changed(obj.parent)
+			for remote in obj._neighbours or ():
+				self.scope_changed(remote)
+			for requirement in self.by_allocation.get(obj, ()):
+				self.requirement_allocated(requirement, obj)
+
+	def requirement_added(self, requirement):
+		if requirement.parameter is not None:
+			self.by_parameter.setdefault(requirement.parameter[0], set()).add(requirement)
+
+	def requirement_allocated(self, requirement, previous):
+		if not self._built:
+			return
+
+		if previous is not None:
+			self.by_allocation[previous].discard(requirement)
+
+		thing = requirement.allocated_to
+		self.by_allocation.setdefault(thing, set()).add(requirement)
+
+		check = set()
+		if requirement.parameter is not None and getattr(thing, 'design', None) is not None:
+			check.add((thing.design, requirement.parameter[0]))
+		self._link(self.checks, self.checked_by, requirement, check)
+
+	# Queries
+
+	def _key(self, ref):
+		if not isinstance(ref, basestring):
+			obj, prop = ref
+			return (obj.design if isinstance(obj, Subsystem) else obj, prop)
+
+		if '.' not in ref:
+			raise OperationException("Expected a reference like 'subsystem.property', got '{}'".format(ref))
+
+		self._refresh()
+		name, prop = ref.rsplit('.', 1)
+		designs = [subsystem.design for subsystem in self.subsystems_by_name.get(name, ()) if subsystem.design is not None]
+		if len(designs) != 1:
+			raise OperationException("'{}' names {} subsystems with designs".format(name, len(designs)))
+
+		return (designs[0], prop)
+
+	# Every parametric requirement whose check reads the property, directly or through any
+	# chain of derived properties. ref is "subsystem.property", (subsystem, property) or
+	# (design, property).
+	def requirements_touching(self, ref):
+		self._refresh()
+		start = self._key(ref)
+		seen = set([start])
+		stack = [start]
+		requirements = set()
+
+		while stack:
+			key = stack.pop()
+			requirements.update(self.checked_by.get(key, ()))
+			for reader in self.read_by.get(key, ()):
+				if reader not in seen:
+					seen.add(reader)
+					stack.append(reader)
+
+		return requirements
+
+	# Every (design, property) a requirement's check reads, directly or indirectly
+	def properties_read_by(self, requirement):
+		self._refresh()
+		stack = list(self.checks.get(requirement, ()))
+		seen = set(stack)
+
+		while stack:
+			for key in self.reads.get(stack.pop(), ()):
+				if key not in seen:
+					seen.add(key)
+					stack.append(key)
+
+		return seen
+
+	def requirements_with_parameter(self, name):
+		return set(self.by_parameter.get(name, ()))
+
+	def requirements_allocated_to(self, thing):
+		self._refresh()
+		return set(self.by_allocation.get(thing, ()))
+
+	def derived_requirements(self, requirement):
+		return list(requirement.children)
+
+	def parent_requirement(self, requirement):
+		return getattr(requirement, 'parent', None)
+
+
+
+# A model context owns one model: its System, the property cache and traceability index for
+# everything in it, and any instrumentation or batched evaluation in progress. Subsystems,
+# designs and requirements join the context that's current when they're created (a
+# subsystem always joins its parent's) and can't be linked to objects in another one.
+#
+# The current context is per thread. It's the default context unless another has been
+# entered with a with statement, so scripts that never mention contexts work as they
+# always have. Separate contexts share nothing mutable, so threads can build and verify
+# models side by side; a single context should only be used by one thread at a time, which
+# its lock is there to arrange.
+class ModelContext(object):
+	def __init__(self, name=None):
+		self.name = name
+		self.system = None
+		self.cache = PropertyCache()
+		self.traceability = TraceabilityIndex()
+		self.columns = PropertyColumns(self)
+		self.instrumentation = None
+		self.batch = None
+		self.lock = threading.RLock()
+
+	def __str__(self):
+		return 'ModelContext "{}"'.format(self.name)
+
+	def __repr__(self):
+		return str(self)
+
+	def __enter__(self):
+		stack = getattr(_contexts, 'stack', None)
+		if stack is None:
+			stack = _contexts.stack = []
+		stack.append(self)
+		return self
+
+	def __exit__(self, *exc):
+		_contexts.stack.pop()
+
+_contexts = threading.local()
+default_context = ModelContext("default")
+
+def current_context():
+	stack = getattr(_contexts, 'stack', None)
+	return stack[-1] if stack else default_context
+
+def _same_context(a, b):
+	if a._context is not b._context:
+		raise SystemDefinitionException("Can't link {} and {}: they belong to different model contexts".format(a, b))
+
+# The default context's index, for scripts that don't use contexts
+traceability = default_context.traceability
+
+
+
+# Parallel verification splits the hierarchy into independent units: a subsystem's own
+# checks, or a whole subtree. Units are verified in forked worker processes which inherit
+# a snapshot of every property value, so references across subtrees are cache hits rather
+# than re-evaluations. Results come back as (owner index, severity, message) and are
+# merged in unit order, which is the order a serial verify() produces.
+
+_parallel_units = None
+_parallel_owners = None
+_parallel_incremental = False
+_parallel_lock = threading.Lock()
+
+def _subtree(root):
+	subsystems = [root]
+	for subsystem in subsystems:
+		subsystems.extend(subsystem.children)
+	return subsystems
+
+def _plan_units(root, count):
+	sizes = {}
+	for subsystem in reversed(_subtree(root)):
+		sizes[subsystem] = 1 + sum(sizes[child] for child in subsystem.children)
+
+	units = [('subtree', root)]
+	while len(units) < count:
+		candidates = [i for i, (kind, subsystem) in enumerate(units) if kind == 'subtree' and subsystem.children]
+		if not candidates:
+			break
+
+		i = max(candidates, key=lambda i: sizes[units[i][1]])
+		subsystem = units[i][1]
+		units[i:i + 1] = [('own', subsystem)] + [('subtree', child) for child in subsystem.children]
+
+	return units
+
+def _verify_unit(index):
+	kind, subsystem = _parallel_units[index]
+
+	if kind == 'own':
+		results = subsystem._iter_own(_parallel_incremental, _check_requirements(_own_requirements(subsystem), _parallel_incremental))
+	else:
+		results = subsystem._iter_subtree(_parallel_incremental)
+
+	return [(_parallel_owners[result.owner], result.severity, result.message) for result in results]
+
+def _verify_parallel(system, incremental, workers):
+	global _parallel_units, _parallel_owners, _parallel_incremental
+
+	subsystems = _subtree(system)
+	_prime_properties(system)
+
+	owners = list(subsystems)
+	requirements = [requirement for subsystem in subsystems for requirement in subsystem.requirements]
+	for requirement in requirements:
+		owners.append(requirement)
+		requirements.extend(requirement.children)
 
+	units = _plan_units(system, workers * 4)
+
+	# Workers pick the plan up from these globals when they're forked, so other threads
+	# have to wait until the pool exists before planning their own
+	with _parallel_lock:
+		_parallel_units = units
+		_parallel_owners = dict((owner, i) for i, owner in enumerate(owners))
+		_parallel_incremental = incremental
+		try:
+			import multiprocessing
+			pool = multiprocessing.Pool(workers)
+		finally:
+			_parallel_units = _parallel_owners = None
+
+	# imap hands units back in order as they complete; if the consumer stops early the
+	# remaining work is abandoned
+	try:
+		for results in pool.imap(_verify_unit, range(len(units))):
+			for owner, severity, message in results:
+				yield VerificationResult(owners[owner], severity, message)
+	finally:
+		pool.terminate()
+		pool.join()
+
+
+# Content keys and persistent verification. The persistent cache (see biggles_cache) keys
+# each subsystem's own results, rather than whole subtrees: a subtree's results can depend
+# on properties outside it (a sibling's width, say), so a hash of the subtree alone
+# couldn't tell when they're stale.
+#
+# A property's key covers its expression, what its subsystem looks like to expressions
+# (names of the design, children and neighbours) and the keys of every property it reads,
+# so it's a Merkle hash over everything the value depends on. A subsystem's results are
+# keyed by its own content (name, design properties, children, neighbours, interfaces and
+# allocated requirements) and the keys of the properties its requirements check. Keys
+# only depend on what's in the model, so one cache can be shared between processes and
+# runs, and whatever hasn't changed since it was last verified is reused rather than
+# re-evaluated. Working out a key reads everything it covers, so keys are kept in the
+# property cache between runs, and invalidated along with the values they cover.
+
+_fingerprint_version = 1
+
+# Value types that go into the persistent cache; anything else is re-evaluated
+_plain_types = (type(None), bool, int, long, float, str, unicode)
+
+def _digest(content):
+	return hashlib.sha1(repr(content)).hexdigest()
+
+# Every requirement verified as part of a subsystem's own checks, in verification order
+def _own_requirements(subsystem):
+	owned = []
+	for requirement in subsystem.requirements:
+		stack = [requirement]
+		while stack:
+			requirement = stack.pop()
+			owned.append(requirement)
+			stack.extend(reversed(requirement.children))
+	return owned
+
+def _checked_property(requirement):
+	design = getattr(requirement.allocated_to, 'design', None)
+	if requirement.parameter is None or design is None:
+		return None
+	return (design, requirement.parameter[0])
+
+def _own_content(subsystem):
+	design = subsystem.design
+	return (type(subsystem).__name__, subsystem.name,
+		None if design is None else (design.name, sorted(design.properties.iteritems())),
+		[(child.name, child.design is not None) for child in subsystem.children],
+		[(remote.name, remote.design is not None) for remote in subsystem._neighbours or ()],
+		[interface.name for interface in subsystem.interfaces],
+		[(type(requirement).__name__, requirement.text, requirement.parameter, len(requirement.children),
+			None if requirement.allocated_to is subsystem else str(requirement.allocated_to))
+			for requirement in _own_requirements(subsystem)])
+
+# Every property read, directly or not, evaluating the given ones
+def _properties_read(keys):
+	seen = set(keys)
+	stack = list(seen)
+	while stack:
+		for key in _references(stack.pop()):
+			if key not in seen:
+				seen.add(key)
+				stack.append(key)
+	return seen
+
+# Content keys for properties and subsystem results. Each is kept in the property cache
+# until an edit to something it covers invalidates it.
+class _ContentKeys(object):
+	def __init__(self, cache):
+		self.cache = cache
+		self.scopes = {}
+		self.keys = cache.content_keys
+
+	def scope(self, subsystem):
+		if subsystem is None:
+			return None
+		try:
+			return self.scopes[subsystem]
+		except KeyError:
+			scope = self.scopes[subsystem] = (subsystem.name, subsystem.design.name,
+				tuple((child.name, child.design is not None) for child in subsystem.children),
+				tuple((remote.name, remote.design is not None) for remote in subsystem._neighbours or ()))
+			return scope
+
+	# Properties read after their own references, without recursing. A property on a
+	# circular definition, or reading one, has no key and is never cached.
+	def property(self, key):
+		keys = self.keys
+		pending = set()
+		stack = [key]
+		while stack:
+			current = stack[-1]
+			if current in keys:
+				stack.pop()
+				continue
+
+			references = _references(current)
+			if current not in pending:
+				pending.add(current)
+				stack.extend(reference for reference in references if reference not in keys and reference not in pending)
+				continue
+
+			stack.pop()
+			pending.discard(current)
+			reads = [keys.get(reference) for reference in references]
+			design, prop = current
+			content = None
+			if None not in reads:
+				content = _digest(('property', _fingerprint_version, self.scope(design.subsystem), prop,
+					design.properties.get(prop), reads))
+			self.cache.store_content_key(current, content, references,
+				[design] if design.subsystem is None else [design, design.subsystem])
+
+		return keys[key]
+
+	# A subsystem with no parametric checks to make is quicker to verify again than to look
+	# up, so it has no key
+	def results(self, subsystem):
+		try:
+			return self.keys[subsystem]
+		except KeyError:
+			pass
+
+		requirements = _own_requirements(subsystem)
+		checked = [key for key in (_checked_property(requirement) for requirement in requirements) if key is not None]
+		reads = [self.property(key) for key in checked]
+
+		content = None
+		if checked and None not in reads:
+			content = _digest(('results', _fingerprint_version, _own_content(subsystem), reads))
+
+		design = subsystem.design
+		structures = [subsystem] + requirements
+		if design is not None:
+			checked += [(design, prop) for prop in design.properties]
+			structures.append(design)
+		self.cache.store_content_key(subsystem, content, checked, structures)
+		return content
+
+# Loads whatever property values the cache has, recording the same dependencies evaluating
+# them would have. Returns the keys that were found.
+def _prime_values(properties, keys, cache):
+	stored = cache.values(keys[key] for key in properties if keys[key] is not None)
+	for key in properties:
+		content = keys[key]
+		design = key[0]
+		if content in stored and key not in design._context.cache.values:
+			design._context.cache.store_derived(key, stored[content], _references(key), (design, design.subsystem))
+	return stored
+
+def _store_values(properties, keys, stored, cache):
+	entries = []
+	for key in properties:
+		content = keys[key]
+		values = key[0]._context.cache.values
+		if content is not None and content not in stored and key in values and type(values[key]) in _plain_types:
+			entries.append((content, values[key]))
+	cache.store_values(entries)
+
+def _iter_cached(root, incremental, cache):
+	subsystems = _subtree(root)
+	keys = _ContentKeys(root._context.cache)
+	known = keys.keys
+	results_keys = dict((subsystem, known[subsystem] if subsystem in known else keys.results(subsystem))
+		for subsystem in subsystems)
+	stored = cache.results(key for key in results_keys.itervalues() if key is not None)
+
+	# Whatever has to be verified again can still start from cached property values
+	again = [requirement for subsystem in subsystems if results_keys[subsystem] not in stored
+		for requirement in _own_requirements(subsystem)]
+	properties = _properties_read([key for key in map(_checked_property, again) if key is not None])
+	for key in properties:
+		keys.property(key)
+	values = _prime_values(properties, keys.keys, cache) if properties else {}
+
+	checked = _check_requirements(again, incremental)
+
+	fresh = []
+	try:
+		stack = [root]
+		while stack:
+			subsystem = stack.pop()
+			key = results_keys[subsystem]
+
+			if key in stored:
+				owners = [subsystem] + _own_requirements(subsystem)
+				results = [VerificationResult(owners[owner], severity, message) for owner, severity, message in stored[key]]
+			else:
+				results = subsystem._iter_own(incremental, checked)
+				if key is not None:
+					results = list(results)
+					index = dict((owner, i) for i, owner in enumerate([subsystem] + _own_requirements(subsystem)))
+					fresh.append((key, [(index[result.owner], result.severity, result.message) for result in results]))
+
+			for result in results:
+				yield result
+
+			stack.extend(reversed(subsystem.children))
+	finally:
+		cache.store_results(fresh)
+		if properties:
+			_store_values(properties, keys.keys, values, cache)
+
+
+class VerificationResult(object):
+	__slots__ = ('severity', 'owner', '_message', '_args')
 
-class VerificationResult():
 	INFO = "Information"
 	WARN = "Warning"
 	ERROR = "Error"
 
-	def __init__(self, owner, severity, message):
+	# Any args are formatted into the message the first time it's read, so results nobody
+	# looks at never pay for building their text
+	def __init__(self, owner, severity, message, *args):
 		self.severity = severity
-		self.message = message
 		self.owner = owner
+		self._message = message
+		self._args = args
+
+	@property
+	def message(self):
+		if self._args:
+			self._message = self._message.format(*self._args)
+			self._args = ()
+		return self._message
 
 	def __str__(self):
 		return "{severity:<16}{message} ({owner})".format(owner=self.owner, severity=self.severity, message=self.message)
@@ -101,17 +2303,115 @@ class VerificationResult():
 	def __repr__(self):
 		return "VerificationResult[{}]".format(str(self))
 
+_removed = object()
+
+# Ordered collection of requirements with constant-time removal. Removed entries leave a
+# marker behind that's compacted away once enough build up; the position index is only
+# built once a collection grows past a handful of entries.
+class RequirementList(object):
+	__slots__ = ('_items', '_positions', '_holes')
+
+	_small = 8
+
+	def __init__(self, items=()):
+		self._items = list(items)
+		self._positions = None
+		self._holes = 0
+
+	def _index(self):
+		if self._positions is None:
+			self._positions = dict((item, i) for i, item in enumerate(self._items) if item is not _removed)
+		return self._positions
+
+	def _compact(self):
+		self._items = [item for item in self._items if item is not _removed]
+		self._positions = None
+		self._holes = 0
+
+	def append(self, item):
+		if self._positions is not None:
+			self._positions[item] = len(self._items)
+		self._items.append(item)
+
+	def extend(self, items):
+		for item in items:
+			self.append(item)
+
+	def remove(self, item):
+		if self._positions is None and len(self._items) <= self._small:
+			self._items.remove(item)
+			return
+
+		try:
+			i = self._index().pop(item)
+		except KeyError:
+			raise ValueError("{} is not in the list".format(item))
+
+		self._items[i] = _removed
+		self._holes += 1
+		if self._holes > self._small and self._holes * 2 > len(self._items):
+			self._compact()
+
+	def __contains__(self, item):
+		if self._positions is None and len(self._items) <= self._small:
+			return item in self._items
+		return item in self._index()
+
+	def __iter__(self):
+		if not self._holes:
+			return iter(self._items)
+		return (item for item in self._items if item is not _removed)
+
+	def __len__(self):
+		return len(self._items) - self._holes
+
+	def __getitem__(self, i):
+		if self._holes:
+			self._compact()
+		return self._items[i]
+
+	def __repr__(self):
+		return repr(list(self))
+
+
 class Subsystem(object):
+	__slots__ = ('name', 'parent', 'children', 'design', 'requirements', 'interfaces', '_children_by_name', '_remotes_by_name',
+		'_neighbours', '_context')
+
 	def __init__(self, name, parent):
+		self._initialise(name, parent, parent._context if parent else current_context())
+
+		if self.parent:
+			self._context.cache.invalidate_structure(self.parent)
+			self._context.columns.member_added(self.parent, 'children', self)
+
+		self._context.traceability.subsystem_added(self)
+
+	# Sets up a new subsystem and adds it to its parent, without telling the context
+	def _initialise(self, name, parent, context):
 		self.name = name
 		self.parent = parent
 		self.children = []
 		self.design = None
-		self.requirements = []
+		self.requirements = RequirementList()
 		self.interfaces = []
+		self._context = context
 
-		if self.parent:
-			self.parent.children.append(self)
+		# Name lookups for dotted references; names needn't be unique so each maps to a list.
+		# Most subsystems are leaves, so these are only created when first needed
+		self._children_by_name = None
+		self._remotes_by_name = None
+
+		# Everything sharing an interface with this subsystem, once each, in the order they
+		# were connected. Kept up to date by _attach_interface, so "interfaces" aggregates
+		# and neighbourhood queries never have to rebuild it.
+		self._neighbours = None
+
+		if parent:
+			parent.children.append(self)
+			if parent._children_by_name is None:
+				parent._children_by_name = {}
+			parent._children_by_name.setdefault(name, []).append(self)
 
 	def __str__(self):
 		return 'Subsytem "{}"'.format(self.name)
@@ -119,40 +2419,104 @@ class Subsystem(object):
 	def __repr__(self):
 		return str(self)
 
-	def verify(self):
-		responses = []
+	def verify(self, incremental=False):
+		return list(self.iter_verify(incremental))
 
-		if not len(self.requirements):
-			responses.append(VerificationResult(self, VerificationResult.WARN, "System has not been allocated any requirements"))
+	def iter_verify(self, incremental=False, severities=None, stop_on_error=False):
+		return _filter_results(self._iter_subtree(incremental, not stop_on_error), severities, stop_on_error)
 
-		for requirement in self.requirements:
-			responses.extend(requirement.verify())
+	# Parametric requirements across the whole subtree are checked together up front, unless
+	# the caller wants the first results as soon as possible (stopping at the first error, say)
+	def _iter_subtree(self, incremental, batched=True):
+		checked = None
+		if batched:
+			checked = _check_requirements([requirement for subsystem in _subtree(self) for requirement in _own_requirements(subsystem)], incremental)
 
-		for child in self.children:
-			responses.extend(child.verify())
+		stack = [self]
+		while stack:
+			subsystem = stack.pop()
 
-		return responses
+			for result in subsystem._iter_own(incremental, checked):
+				yield result
+
+			stack.extend(reversed(subsystem.children))
+
+	def _iter_own(self, incremental, checked=None):
+		if not len(self.requirements):
+			yield VerificationResult(self, VerificationResult.WARN, "System has not been allocated any requirements")
+
+		for requirement in self.requirements:
+			for result in requirement._iter_verify(incremental, checked):
+				yield result
 
 	def interfaces_with(self, subsystem, name=None):
 		if name is None:
 			name = "{} <-> {}".format(self.name, subsystem.name)
 
-		i = Interface(name, self, subsystem)
-		self.interfaces.append(i)
-		subsystem.interfaces.append(i)
+		return _attach_interface(Interface(name, self, subsystem))
+
+	def neighbours(self):
+		return list(self._neighbours or ())
+
+	# Every subsystem within the given number of interface hops, nearest first, as
+	# (subsystem, hops) pairs
+	def neighbourhood(self, hops=1):
+		distances = {self: 0}
+		found = []
+		frontier = [self]
+
+		for distance in range(1, hops + 1):
+			reached = []
+			for subsystem in frontier:
+				for remote in subsystem._neighbours or ():
+					if remote not in distances:
+						distances[remote] = distance
+						reached.append(remote)
+						found.append((remote, distance))
+			if not reached:
+				break
+			frontier = reached
+
+		return found
+
+# Connects every subsystem on an interface to all the others
+def _attach_interface(interface):
+	context = interface.systems[0]._context
+	for local in interface.systems:
+		_same_context(local, interface.systems[0])
 
-		return i
+	for local in interface.systems:
+		local.interfaces.append(interface)
+
+		for remote in interface.systems:
+			if remote is local:
+				continue
+			if local._remotes_by_name is None:
+				local._remotes_by_name = {}
+				local._neighbours = []
+
+			same_name = local._remotes_by_name.setdefault(remote.name, [])
+			if remote not in same_name:
+				same_name.append(remote)
+				local._neighbours.append(remote)
+				context.columns.member_added(local, 'interfaces', remote)
+
+		context.cache.invalidate_structure(local)
+
+	context.traceability.interface_added(interface)
+	return interface
 
 
 # System works the same as subsystem except that there can only be one of them and they don't have a parent
 class System(Subsystem):
-	_inst = None
+	__slots__ = ()
 
 	def __init__(self, *args, **kwargs):
-		if System._inst is not None:
-			raise SystemDefinitionException("Only one System may be defined")
+		context = current_context()
+		if context.system is not None:
+			raise SystemDefinitionException("Only one System may be defined in a model context")
 
-		System._inst = self
+		context.system = self
 
 		super(System, self).__init__(parent=None, *args, **kwargs)
 
@@ -161,19 +2525,34 @@ class System(Subsystem):
 		return 'System "{}"'.format(self.name)
 
 
-	def verify(self):
-		responses = []
+	# A cache (e.g. biggles_cache.VerificationCache) lets results and property values for
+	# unchanged parts of the model be reused from earlier runs; anything that does need
+	# verifying again is verified serially
+	def verify(self, incremental=False, workers=None, cache=None):
+		return list(self.iter_verify(incremental, workers=workers, cache=cache))
+
+	def iter_verify(self, incremental=False, severities=None, stop_on_error=False, workers=None, cache=None):
+		return _filter_results(self._iter_system(incremental, workers, cache, not stop_on_error), severities, stop_on_error)
 
+	def _iter_system(self, incremental, workers, cache, batched=True):
 		if not len(self.children):
-			responses.append(VerificationResult(self, VerificationResult.WARN, "System has no children"))
+			yield VerificationResult(self, VerificationResult.WARN, "System has no children")
 
-		responses.extend(super(System, self).verify())
+		if cache is not None:
+			results = _iter_cached(self, incremental, cache)
+		elif workers is not None and workers > 1 and hasattr(os, 'fork'):
+			results = _verify_parallel(self, incremental, workers)
+		else:
+			results = self._iter_subtree(incremental, batched)
 
-		return responses
+		for result in results:
+			yield result
 
 
 # User is just another subsystem but doesn't have to belong to the heirarchy
 class User(Subsystem):
+	__slots__ = ()
+
 	def __init__(self, name):
 		super(User, self).__init__(name, parent=None)
 
@@ -185,10 +2564,17 @@ class User(Subsystem):
 
 
 class Design(object):
+	__slots__ = ('properties', '_expressions', 'name', 'subsystem', '_context')
+
 	def __init__(self, name):
+		self._initialise(name, current_context())
+
+	def _initialise(self, name, context):
 		self.properties = {}
+		self._expressions = {}
 		self.name = name
 		self.subsystem = None
+		self._context = context
 
 	def __str__(self):
 		return 'Design "{name}" [implementing {subsys} with {props}]'.format(name=self.name, subsys=self.subsystem, props=self.properties)
@@ -198,105 +2584,157 @@ class Design(object):
 
 	def __getitem__(self, item):
 		if item not in self.properties:
-			return super(Design, self).__getitem__(self, item)
+			raise KeyError(item)
 
-		prop = self.properties[item]
+		return self.get_property(item)
 
-		if not isinstance(prop, basestring):
-			return prop
+	def add_property(self, **properties):
+		self._add_properties(properties, compile_expression)
+
+	# Bulk loaders pass their own compile function, e.g. one memoised over a batch of values
+	def _add_properties(self, properties, compile):
+		for prop, value in properties.iteritems():
+			# Property names repeat across every design in a model, so share one copy of each
+			prop = intern(prop)
+			previous = self._expressions.get(prop)
+			expression = compile(value)
+			self.properties[prop] = value
+			self._expressions[prop] = expression
+
+			# Swapping one literal for another with the same units can't change any dimension
+			same_dimension = (isinstance(previous, _Constant) and isinstance(expression, _Constant)
+				and previous.dimension == expression.dimension)
+			self._context.cache.invalidate((self, prop), not same_dimension)
+			if previous is None:
+				self._context.cache.invalidate_content(self)
+			self._context.columns.property_changed(self, prop)
+			self._context.traceability.property_changed(self, prop)
 
-		els = prop.split(' ')
-		out = []
-		for el in els:
-			for unit in unit_conversions:
-				if el.endswith(unit):
-					el = '({}*{})'.format(el, unit_conversions[unit])
-					break
-			out.append(el)
+	def get_property(self, prop):
+		key = (self, prop)
+		context = self._context
+		cache = context.cache
 
-		eval_str = ' '.join(out)
-		
+		try:
+			value = cache.lookup(key)
+		except KeyError:
+			pass
+		else:
+			if context.instrumentation is not None:
+				context.instrumentation.hit(self, prop, value)
+			return value
 
+		if cache.in_progress(key):
+			path = [k for k in cache._computing if isinstance(k, tuple)]
+			path = path[path.index(key):] + [key]
+			raise CircularDefinitionException("Circular definition: {}".format(_format_path(path)))
 
-	def add_property(self, **properties):
-		# I'm sure there's a better way to take the union of two dicts..
-		self.properties = dict(self.properties.items() + properties.items())
+		if len(cache._computing) >= _recursion_budget:
+			for design, dependency in evaluation_order([key])[:-1]:
+				design.get_property(dependency)
 
-	def get_property(self, prop):
+		if context.instrumentation is not None:
+			return self._instrumented_property(prop)
+
+		cache.begin(key)
+		try:
+			cache.read_structure(self)
+			if self.subsystem is not None:
+				cache.read_structure(self.subsystem)
+
+			value = self._evaluate_property(prop)
+		finally:
+			cache.end(key)
+
+		cache.store(key, value)
+		return value
+
+	def _instrumented_property(self, prop):
+		key = (self, prop)
+		cache = self._context.cache
+		instrumentation = self._context.instrumentation
+		depth = len(cache._computing) + 1
+		value = None
+
+		instrumentation.begin()
+		start = time.time()
+		cache.begin(key)
+		try:
+			cache.read_structure(self)
+			if self.subsystem is not None:
+				cache.read_structure(self.subsystem)
+
+			value = self._evaluate_property(prop)
+		finally:
+			cache.end(key)
+			instrumentation.evaluated(self, prop, value, time.time() - start, depth)
 
+		cache.store(key, value)
+		return value
+
+	def _evaluate_property(self, prop):
 		if not prop in self.properties:
 			return None
 
 		if not self.subsystem:
 			raise VerificationException("Trying to verify design {} but is not linked to subsystem".format(self))
 
-		try:
-			return _normalise_property(self.properties[prop])
-		except VerificationException:
-			pass # If the property can't be interpretted directly, it's likely in need of dynamic calculation
+		# Units are checked before anything derived is worked out
+		expression = self._expressions[prop]
+		if not isinstance(expression, _Constant):
+			self.dimension_of(prop)
 
 		try:
-			return _find_and_normalise(self.properties[prop], self, self.subsystem.children + _collect_remotes(self, self.subsystem.interfaces))
-		except VerificationException:
-			pass # If the property can't be interpretted directly, it's likely in need of dynamic calculation
+			return expression.evaluate(self, prop)
+		except (TypeError, ValueError, ZeroDivisionError):
+			raise VerificationException("Can't work out how to get property '{}' for design '{}'".format(prop, self))
 
+	# The dimension of a property, or None if it can't be known (a boolean, say, or a
+	# reference to something that isn't there). Derived properties get theirs from whatever
+	# they read, worked out once until something it reads changes. Raises VerificationException if
+	# the property's expression, or anything it reads, mixes dimensions.
+	def dimension_of(self, prop):
+		expression = self._expressions.get(prop)
+		if expression is None or isinstance(expression, _Constant):
+			return None if expression is None else expression.dimension
 
+		cache = self._context.cache
 		try:
-			terms = self.properties[prop].split(' ')
-
-			if len(terms) == 2:
-				op, scope = terms
-
-				if scope == 'children':
-					props = [ _normalise_property(child.design.get_property(prop))
-						for child in self.subsystem.children
-						if child.design is not None and child.design.get_property(prop) is not None ]
-				elif scope == 'interfaces':
-					remotes = _collect_remotes(self, self.subsystem.interfaces)
-					props = [ _normalise_property(remote.design.get_property(prop))
-						for remote in remotes
-						if remote.design is not None and remote.design.get_property(prop) is not None ]
-				else:
-					raise VerificationException("Unknown dynamic property scope '{}'".format(scope))
-
-				if not len(props):
-					raise VerificationException("Can't find property '{}' in any objects in scope '{}'".format(prop, scope))
-
-				if op == 'max':
-					return max(props)
-				elif op == 'sum':
-					return sum(props)
-			elif len(terms) == 3:
-				print(terms)
-				term1, op, term2 = terms
-
-				term1 = _find_and_normalise(term1, self, self.subsystem.children + _collect_remotes(self, self.subsystem.interfaces))
-				term2 = _find_and_normalise(term2, self, self.subsystem.children + _collect_remotes(self, self.subsystem.interfaces))
-				print(term1, op, term2)
-				if op == '+': return term1 + term2
-				elif op == '-': return term1 - term2
-				elif op == '*': return term1 * term2
-				elif op == '/': return term1 / term2
-				else:
-					raise VerificationException("Unknown operation '{}' in calculation '{}'".format(op, terms))
-			else:
-				raise VerificationException("Can't interpret property string '{}' for design '{}'".format(prop, self))
+			dimension = cache.dimensions[(self, prop)]
+		except KeyError:
+			dimension = _infer_dimensions((self, prop), cache)
 
-		except ValueError, TypeError:
-			raise VerificationException("Can't work out how to get property '{}' for design '{}'".format(prop, self))
+		if isinstance(dimension, VerificationException):
+			raise dimension
+		return dimension
 
 	def implements(self, subsystem):
+		_same_context(self, subsystem)
+		cache = self._context.cache
+
+		# Anything that could see either the old or the new link needs recalculating
+		for obj in (self, self.subsystem, subsystem, subsystem.design, subsystem.parent):
+			if obj is not None:
+				cache.invalidate_structure(obj)
+		for remote in subsystem._neighbours or ():
+			cache.invalidate_structure(remote)
+
+		previous = self.subsystem
 		self.subsystem = subsystem
 		self.subsystem.design = self
+		self._context.columns.design_linked(previous, subsystem)
+		self._context.traceability.design_linked(self, previous, subsystem)
 
 
 class Interface(object):
+	__slots__ = ('systems', 'name', 'requirements')
+
 	def __init__(self, name, *systems):
 		if len(systems) < 2:
 			raise SystemDefinitionException("Tried to create an interface between fewer than two things")
 		self.systems = systems
 		self.name = name
-		self.requirements = []
+		self.requirements = RequirementList()
 
 	def __str__(self):
 		return 'Interface "{}"'.format(self.name)
@@ -305,21 +2743,30 @@ class Interface(object):
 		return str(self)
 
 class Requirement(object):
+	__slots__ = ('allocated_to', 'text', 'children', 'parameter', '_context')
+
 	def __init__(self, text, **parametrics):
 		self.allocated_to = None
 		self.text = text
 		self.children = []
+		self._context = self._initial_context()
 
 		if len(parametrics) == 0:
 			self.parameter = None
 		elif len(parametrics) == 1:
 			parameter_item = parametrics.items()[0]
 			parameter, operation = parameter_item[0].split('__')
+			parameter, operation = intern(parameter), intern(operation)
 			#parameter = parameter.replace("_", " ")
 			self.parameter = (parameter, operation, parameter_item[1])
 		else:
 			raise SystemDefinitionException("Can't have a single requirement with multiple parametric constraints, try building derived requirements")
 
+		self._context.traceability.requirement_added(self)
+
+	def _initial_context(self):
+		return current_context()
+
 	def __str__(self):
 		return 'Requirement "The {} {}"'.format(self.allocated_to, self.text)
 
@@ -335,12 +2782,18 @@ class Requirement(object):
 				raise SystemDefinitionException("Tried to re-allocate a requirement to an interface not connected to the existing owner")
 		else:
 			raise SystemDefinitionException("Tried to allocate a requirement to something other than a System/Subsystem/Interface")
+		_same_context(self, thing if isinstance(thing, Subsystem) else thing.systems[0])
 
-		if self.allocated_to is not None:
-			self.allocated_to.requirements.remove(self)
+		previous = self.allocated_to
+		if previous is not None:
+			previous.requirements.remove(self)
+			self._context.cache.invalidate_content(previous)
 
 		thing.requirements.append(self)
 		self.allocated_to = thing
+		self._context.cache.invalidate_structure(self)
+		self._context.cache.invalidate_content(thing)
+		self._context.traceability.requirement_allocated(self, previous)
 
 		# Recursively allocate all derived requirements too
 		for child in self.children:
@@ -348,8 +2801,69 @@ class Requirement(object):
 
 	def parent_of(self, requirement):
 		self.children.append(requirement)
+		self._context.cache.invalidate_structure(self)
+
+	def verify(self, incremental=False):
+		return list(self.iter_verify(incremental))
+
+	def iter_verify(self, incremental=False, severities=None, stop_on_error=False):
+		return _filter_results(self._iter_verify(incremental), severities, stop_on_error)
+
+	# See pass_probabilities(); None if the requirement has no parametric check to make
+	def pass_probability(self, samples=None, seed=None):
+		return pass_probabilities([self], samples, seed).get(self)
+
+	# checked holds checks already made for some requirements, as {requirement: checks}
+	def _iter_verify(self, incremental, checked=None):
+		stack = [self]
+		while stack:
+			requirement = stack.pop()
+
+			checks = checked.get(requirement) if checked else None
+			if checks is None:
+				checks = requirement._checks(incremental)
+
+			for result in checks:
+				yield result
+
+			stack.extend(reversed(requirement.children))
+
+	# The requirement's own checks are cached alongside the property values they read, so
+	# an incremental run only re-checks requirements downstream of an edit
+	def _checks(self, incremental):
+		cache = self._context.cache
+		if incremental:
+			try:
+				checks = cache.lookup(self)
+			except KeyError:
+				pass
+			else:
+				if self._context.instrumentation is not None:
+					self._context.instrumentation.cached_check(self)
+				return checks
+
+		instrumentation = self._context.instrumentation
+		if instrumentation is not None:
+			instrumentation.begin()
+			start = time.time()
 
-	def verify(self):
+		cache.begin(self)
+		try:
+			cache.read_structure(self)
+			if self.allocated_to is not None:
+				cache.read_structure(self.allocated_to)
+
+			checks = self._check()
+		finally:
+			cache.end(self)
+			if instrumentation is not None:
+				instrumentation._children.pop()
+				instrumentation.checked(self, time.time() - start)
+
+		cache.store(self, checks)
+		return checks
+
+	def _check(self):
 		responses = []
 
 		if not self.allocated_to:
@@ -369,36 +2883,33 @@ class Requirement(object):
 					responses.append(VerificationResult(self, VerificationResult.WARN, "Parametric design can't be verified because there's no implementing design attached"))
 				else:
 					actual_value = design.get_property(parameter)
-
-					passed = _verify_parameter(actual_value, operation, literal)
-
-					if passed:
-						responses.append(VerificationResult(self, VerificationResult.INFO, "Requirement passed: {} {} {}".format(actual_value, operation, literal)))
-					else:
-						responses.append(VerificationResult(self, VerificationResult.ERROR, "Requirement failed: {} {} {}".format(actual_value, operation, literal)))
-
-		for child in self.children:
-			responses.extend(child.verify())
+					passed = _verify_parameter(actual_value, operation, literal, design.dimension_of(parameter))
+					responses.append(_parametric_result(self, actual_value, passed))
 
 		return responses
 
 
 # Does this need to be a separate thing?
 class ExternalRequirement(Requirement):
-	pass
+	__slots__ = ()
 
 class Constraint(Requirement):
-	pass
+	__slots__ = ()
 
 class DerivedRequirement(Requirement):
+	__slots__ = ('parent',)
+
 	def __init__(self, parent, *args, **kwargs):
 		self.parent = parent
 		parent.parent_of(self)
 		super(DerivedRequirement, self).__init__(*args, **kwargs)
 
+	def _initial_context(self):
+		return self.parent._context
+
 class RequirementSet(object):
 	def __init__(self):
-		self.requirements = []
+		self.requirements = RequirementList()
 		self.allocated = False
 
 	def add(self, requirement):
@@ -421,3 +2932,122 @@ class RequirementSet(object):
 
 class ExternalRequirementSet(RequirementSet):
 	pass
+
+
+# Bulk building, for importers and snapshot loaders that create a whole model at once. Used
+# as a context manager it builds in the given model context (or the current one) with the
+# cyclic garbage collector off, since none of the millions of objects a large model needs
+# are garbage and the collector would only scan them over and over.
+#
+# Identical property values share one compiled expression, interfaces can join any number
+# of subsystems, and allocations are restored as given rather than replayed through
+# allocate_to, which would re-apply its re-allocation rules and cascade to derived
+# requirements.
+#
+# Subsystems and designs made with subsystems() and designs() skip the property cache and
+# column updates the constructors, add_property and implements make. Nothing can have been
+# evaluated against a subsystem the builder has only just made, so there's nothing for them
+# to invalidate; a design for anything next to an older part of the model goes the normal
+# way.
+class BulkBuilder(object):
+	def __init__(self, context=None):
+		self.context = context or current_context()
+		self._compiled = {}
+		self._gc_enabled = None
+		self._new = set()
+
+	def __enter__(self):
+		self._gc_enabled = gc.isenabled()
+		gc.disable()
+		self.context.__enter__()
+		return self
+
+	def __exit__(self, *exc):
+		self.context.__exit__(*exc)
+		if self._gc_enabled:
+			gc.enable()
+
+	def compile(self, value):
+		key = (type(value), value)
+		try:
+			return self._compiled[key]
+		except KeyError:
+			expression = self._compiled[key] = compile_expression(value)
+			return expression
+
+	def add_properties(self, design, properties):
+		design._add_properties(properties, self.compile)
+
+	# Builds a list of subsystems from parallel sequences of classes (Subsystem or a
+	# subclass), names and parents, where each parent is the position in the list of one
+	# that comes earlier, or -1 for none
+	def subsystems(self, classes, names, parents):
+		context = self.context
+		traceability = context.traceability
+		new = self._new
+		built = []
+
+		for cls, name, parent in zip(classes, names, parents):
+			parent = built[parent] if parent >= 0 else None
+			if cls is not Subsystem:
+				if issubclass(cls, System) and context.system is not None:
+					raise SystemDefinitionException("Only one System may be defined in a model context")
+			subsystem = cls.__new__(cls)
+			subsystem._initialise(name, parent, context)
+			if cls is not Subsystem and issubclass(cls, System):
+				context.system = subsystem
+			new.add(subsystem)
+			traceability.subsystem_added(subsystem)
+			built.append(subsystem)
+
+		return built
+
+	# Builds a design implementing each subsystem from parallel sequences of names,
+	# subsystems and {property: value}
+	def designs(self, names, subsystems, properties):
+		context = self.context
+		traceability = context.traceability
+		new = self._new
+		compiled = self._compiled
+		built = []
+
+		for name, subsystem, props in zip(names, subsystems, properties):
+			design = Design.__new__(Design)
+			design._initialise(name, context)
+			if subsystem._context is not context:
+				_same_context(design, subsystem)
+			built.append(design)
+
+			if (subsystem.design is not None or subsystem not in new or (subsystem.parent is not None and subsystem.parent not in new)
+					or (subsystem._neighbours and not all(remote in new for remote in subsystem._neighbours))):
+				self.add_properties(design, props)
+				design.implements(subsystem)
+				continue
+
+			values = design.properties
+			expressions = design._expressions
+			for prop, value in props.iteritems():
+				prop = intern(prop)
+				values[prop] = value
+				try:
+					expressions[prop] = compiled[(type(value), value)]
+				except KeyError:
+					expressions[prop] = self.compile(value)
+			design.subsystem = subsystem
+			subsystem.design = design
+			traceability.design_linked(design, None, subsystem)
+
+		return built
+
+	def connect(self, name, systems):
+		if len(systems) == 2:
+			return systems[0].interfaces_with(systems[1], name=name)
+		return _attach_interface(Interface(name, *systems))
+
+	def allocate(self, requirement, thing):
+		_same_context(requirement, thing if isinstance(thing, Subsystem) else thing.systems[0])
+		thing.requirements.append(requirement)
+		requirement.allocated_to = thing
+		requirement._context.cache.invalidate_structure(requirement)
+		requirement._context.cache.invalidate_content(thing)
+		requirement._context.traceability.requirement_allocated(requirement, None)
@@ -0,0 +1,545 @@
+#!/usr/bin/env python
+
+# Benchmarks for model construction, property evaluation, expression parsing and
+# verification over synthetic models. Each benchmark runs in a forked child so it starts
+# from a clean heap, has a fresh default model context and reports its own peak RSS. Results are
+# printed as JSON and can be checked against a saved baseline. The startup command times
+# imports and a small verify from a fresh interpreter against fixed budgets.
+
+import argparse
+import cPickle as pickle
+import imp
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import biggles
+
+
+# Model generators. Each takes a rough number of subsystems and returns the System.
+
+def _design(module, subsystem, **properties):
+	design = module.Design("{} design".format(subsystem.name))
+	design.add_property(**properties)
+	design.implements(subsystem)
+	return design
+
+def _leaf_properties(i):
+	return dict(mass="{}kg".format(i % 7 + 1), width="{}mm".format(i % 900 + 100), length="{}mm".format(i % 500 + 500))
+
+# Leaves of the wide model also have something for the system to count and average
+def _wide_leaf_properties(i):
+	properties = _leaf_properties(i)
+	properties.update(parts="{}".format(i % 3 + 1), mean_mass=properties['mass'])
+	return properties
+
+def build_model(nodes, fanout=50, module=biggles):
+	system = module.System("Benchmark System")
+	_design(module, system, mass="sum children", width="max children")
+
+	parents = [system]
+	subsystems = [system]
+	while len(subsystems) < nodes:
+		parent = parents.pop(0)
+		for i in range(min(fanout, nodes - len(subsystems))):
+			subsystem = module.Subsystem("part {}".format(len(subsystems)), parent)
+			design = module.Design("part design {}".format(len(subsystems)))
+			design.add_property(mass="{}kg".format(len(subsystems) % 7 + 1), width="{}mm".format(len(subsystems) % 900 + 100))
+			design.implements(subsystem)
+
+			if len(subsystems) % 10 == 0:
+				requirement = module.Requirement("shall weigh less than 10kg", mass__lte="10kg")
+				requirement.allocate_to(subsystem)
+
+			subsystems.append(subsystem)
+			parents.append(subsystem)
+
+	return system
+
+# One very wide level under the system
+def wide_model(size, module=biggles):
+	system = module.System("Wide System")
+	_design(module, system, mass="sum children", width="max children", parts="count children", mean_mass="mean children")
+	module.Requirement("shall weigh less than a tonne", mass__lte="1000kg").allocate_to(system)
+
+	for i in range(size - 1):
+		_design(module, module.Subsystem("part {}".format(i), system), **_wide_leaf_properties(i))
+
+	return system
+
+# A long spine where every level rolls up its children
+def deep_model(size, module=biggles):
+	system = module.System("Deep System")
+	_design(module, system, mass="sum children")
+	module.Requirement("shall weigh less than a tonne", mass__lte="1000kg").allocate_to(system)
+
+	spine = system
+	for i in range((size - 1) // 2):
+		_design(module, module.Subsystem("leaf {}".format(i), spine), **_leaf_properties(i))
+		spine = module.Subsystem("level {}".format(i), spine)
+		_design(module, spine, mass="sum children")
+	_design(module, module.Subsystem("bottom", spine), mass="1kg")
+
+	return system
+
+# Buses each wired to many loads, rolling load currents up over their interfaces
+def interface_model(size, module=biggles, loads_per_bus=16, seed=1):
+	rng = random.Random(seed)
+	system = module.System("Electrical System")
+	_design(module, system, current="sum children")
+
+	buses = max(1, size // (loads_per_bus + 1))
+	loads = [module.Subsystem("load_{}".format(i), system) for i in range(max(1, size - buses - 1))]
+	for i, load in enumerate(loads):
+		_design(module, load, current="{}A".format(i % 5 + 1), peak="{}A".format(i % 5 + 3), voltage="24V")
+
+	for i in range(buses):
+		bus = module.Subsystem("bus_{}".format(i), system)
+		wired = rng.sample(loads, min(loads_per_bus, len(loads)))
+		for load in wired:
+			bus.interfaces_with(load)
+		_design(module, bus, current="sum interfaces", peak="max interfaces",
+			power="current * {}.voltage".format(wired[0].name))
+		module.Requirement("shall carry less than 100A", current__lte="100A").allocate_to(bus)
+
+	return system
+
+# Moderate fanout with arithmetic over dotted references at every level. Names are single
+# words, since a name with a separate number in it can't be referred to in an expression.
+def derived_model(size, module=biggles, fanout=8):
+	system = module.System("Derived System")
+	subsystems = [system]
+	parents = [system]
+
+	while len(subsystems) < size:
+		parent = parents.pop(0)
+		for i in range(min(fanout, size - len(subsystems))):
+			subsystem = module.Subsystem("unit_{}".format(len(subsystems)), parent)
+			subsystems.append(subsystem)
+			parents.append(subsystem)
+
+	for i, subsystem in enumerate(subsystems):
+		if subsystem.children:
+			first, last = subsystem.children[0].name, subsystem.children[-1].name
+			_design(module, subsystem, mass="sum children", width="max children",
+				length="{}.length + {}.length + 50mm".format(first, last),
+				area="width * length", load="mass * 9.81 + 2 * {}.mass".format(first))
+		else:
+			_design(module, subsystem, **_leaf_properties(i))
+
+		if i % 5 == 0:
+			module.Requirement("shall fit", width__lte="1000mm").allocate_to(subsystem)
+
+	return system
+
+# A large requirement tree, derived requirements down the hierarchy
+def requirement_model(size, module=biggles, fanout=10):
+	system = build_model(max(2, size // 4), fanout=fanout, module=module)
+
+	top = module.Requirement("shall be light", mass__lte="100000kg")
+	requirements = [top]
+	for parent in requirements:
+		if len(requirements) >= size:
+			break
+		for i in range(fanout):
+			requirements.append(module.DerivedRequirement(parent, "shall be lighter", mass__lte="10000kg"))
+	top.allocate_to(system)
+
+	return system
+
+GENERATORS = {
+	'uniform': build_model,
+	'wide': wide_model,
+	'deep': deep_model,
+	'interfaces': interface_model,
+	'derived': derived_model,
+	'requirements': requirement_model,
+}
+
+DEFAULT_SIZES = {
+	'uniform': 20000,
+	'wide': 20000,
+	'deep': 400,
+	'interfaces': 20000,
+	'derived': 20000,
+	'requirements': 20000,
+}
+
+
+def _all_subsystems(system):
+	subsystems = [system]
+	seen = set(subsystems)
+	for subsystem in subsystems:
+		for obj in list(subsystem.children) + [remote for inter in subsystem.interfaces for remote in inter.systems]:
+			if obj not in seen:
+				seen.add(obj)
+				subsystems.append(obj)
+	return subsystems
+
+# Every generated property evaluates, so an error means the benchmark would be timing
+# failures rather than evaluations
+def _evaluate_all(designs):
+	count = 0
+	for design in designs:
+		for prop in design.properties:
+			design.get_property(prop)
+			count += 1
+	return count
+
+
+def _max_rss_kb():
+	usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == 'darwin':
+		usage /= 1024
+	return usage
+
+# Runs func in a forked child so each measurement starts from a clean heap and a fresh
+# default model context
+def _in_child(func, *args):
+	read, write = os.pipe()
+	pid = os.fork()
+
+	if pid == 0:
+		os.close(read)
+		try:
+			result = func(*args)
+		except BaseException as e:
+			result = e
+		with os.fdopen(write, 'wb') as f:
+			pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+		os._exit(0)
+
+	os.close(write)
+	with os.fdopen(read, 'rb') as f:
+		result = pickle.load(f)
+	os.waitpid(pid, 0)
+
+	if isinstance(result, BaseException):
+		raise result
+	return result
+
+def _record(benchmark, generator, size, seconds, count, unit):
+	return {
+		'benchmark': benchmark,
+		'generator': generator,
+		'size': size,
+		'seconds': seconds,
+		'count': count,
+		'throughput': count / seconds if seconds else None,
+		'unit': unit,
+	}
+
+def _model_benchmarks(generator, size):
+	results = []
+
+	start = time.time()
+	system = GENERATORS[generator](size)
+	elapsed = time.time() - start
+	subsystems = _all_subsystems(system)
+	results.append(_record('construct', generator, size, elapsed, len(subsystems), 'subsystems/s'))
+
+	designs = [subsystem.design for subsystem in subsystems if subsystem.design is not None]
+
+	system._context.cache.clear()
+	start = time.time()
+	count = _evaluate_all(designs)
+	results.append(_record('get_property_cold', generator, size, time.time() - start, count, 'properties/s'))
+
+	start = time.time()
+	count = _evaluate_all(designs)
+	results.append(_record('get_property_warm', generator, size, time.time() - start, count, 'properties/s'))
+
+	system._context.cache.clear()
+	start = time.time()
+	count = len(system.verify())
+	results.append(_record('verify', generator, size, time.time() - start, count, 'results/s'))
+
+	start = time.time()
+	count = len(system.verify(incremental=True))
+	results.append(_record('verify_incremental', generator, size, time.time() - start, count, 'results/s'))
+
+	# A persistent cache, first empty and then holding everything the first run stored
+	import biggles_cache
+	handle, path = tempfile.mkstemp(suffix='.cache')
+	os.close(handle)
+	try:
+		with biggles_cache.VerificationCache(path) as cache:
+			for benchmark in ('verify_cache_cold', 'verify_cache_warm'):
+				system._context.cache.clear()
+				start = time.time()
+				count = len(system.verify(cache=cache))
+				results.append(_record(benchmark, generator, size, time.time() - start, count, 'results/s'))
+	finally:
+		os.unlink(path)
+
+	peak = _max_rss_kb()
+	for result in results:
+		result['peak_rss_kb'] = peak
+	return results
+
+
+EXPRESSIONS = (
+	"2000mm",
+	"max children",
+	"sum children + 5kg",
+	"chassis.width + 100mm",
+	"front frame length + interconnector length + rear frame length",
+	"(width - 2 * margin) * length / 2",
+	"-(aero.drag * 1.2e3 N) / mass",
+)
+
+# Literal-only expressions the prototype parsers can also handle
+LITERAL_EXPRESSIONS = (
+	"{}mm + 1cm",
+	"{}cm +/- 10mm",
+	"4{}cm +/- 20cm - 2m",
+	"({} + 1) * 3",
+)
+
+# The expression prototypes, where their dependencies are installed
+def _prototype_parsers():
+	parsers = []
+
+	try:
+		import bg_parsetest
+		parsers.append(('bg_parsetest.re_process', bg_parsetest.re_process))
+	except ImportError:
+		pass
+
+	try:
+		import mg_test
+		parsers.append(('mg_test.parse', mg_test.parse))
+	except ImportError:
+		pass
+
+	return parsers
+
+def _compile_expression(source):
+	expression = biggles.compile_expression(source)
+	if isinstance(expression, biggles._Unparseable):
+		raise expression.error
+	return expression
+
+def _time_parser(benchmark, name, parse, sources):
+	start = time.time()
+	for source in sources:
+		parse(source)
+	return _record(benchmark, name, len(sources), time.time() - start, len(sources), 'expressions/s')
+
+def _parse_benchmark(count, prototypes=True):
+	# Every string is unique so nothing is served from a cache, except where that's the point
+	sources = ["{} + {}mm".format(EXPRESSIONS[i % len(EXPRESSIONS)], i) for i in range(count)]
+	results = [_time_parser('parse', 'expressions', _compile_expression, sources)]
+	results.append(_time_parser('parse_cached', 'expressions', _compile_expression, sources))
+
+	literals = [LITERAL_EXPRESSIONS[i % len(LITERAL_EXPRESSIONS)].format(i + 1) for i in range(count)]
+	results.append(_time_parser('parse_literals', 'biggles', _compile_expression, literals))
+
+	if prototypes:
+		for name, parse in _prototype_parsers():
+			results.append(_time_parser('parse_literals', name, parse, literals))
+
+	peak = _max_rss_kb()
+	for result in results:
+		result['peak_rss_kb'] = peak
+	return results
+
+
+def _model_memory(nodes, module_path):
+	if module_path is None:
+		module = biggles
+	else:
+		module = imp.load_source('biggles_compare', module_path)
+
+	before = _max_rss_kb()
+	system = build_model(nodes, module=module)
+	return _max_rss_kb() - before
+
+# Peak RSS of a synthetic model, optionally against another copy of biggles.py (e.g. an
+# older release) building the same model
+def memory_benchmark(nodes=500000, compare=None):
+	result = {'nodes': nodes}
+	result['kb'] = _in_child(_model_memory, nodes, None)
+	result['bytes_per_node'] = result['kb'] * 1024.0 / nodes
+
+	if compare is not None:
+		result['compare_kb'] = _in_child(_model_memory, nodes, compare)
+		result['compare_bytes_per_node'] = result['compare_kb'] * 1024.0 / nodes
+		result['reduction'] = 1 - float(result['kb']) / result['compare_kb']
+
+	return result
+
+
+# Startup time. Each module is imported in a fresh interpreter, best of a few runs, noting
+# any of the slow optional modules the import dragged in. verify_small is the whole of a
+# short-lived check, from starting the interpreter to verifying a small model, as an editor
+# running a verify on save would see it.
+
+STARTUP_MODULES = ('biggles', 'biggles_cache', 'biggles_snapshot', 'biggles_import', 'biggles_service', 'bg_parsetest')
+
+_slow_modules = ('numpy', 'multiprocessing', 'pint', 'textx', 'uncertainties')
+
+# Budgets in seconds, for compiled modules and a warm file cache. Importing biggles mustn't
+# load any of the slow modules at all.
+STARTUP_BUDGETS = {
+	('import', 'biggles'): 0.02,
+	('import', 'biggles_cache'): 0.03,
+	('import', 'biggles_snapshot'): 0.03,
+	('import', 'biggles_import'): 0.03,
+	('import', 'biggles_service'): 0.04,
+	('import', 'bg_parsetest'): 0.03,
+	('verify_small', 'uniform'): 0.15,
+}
+
+_import_script = """
+import sys, time
+start = time.time()
+import {module}
+print(time.time() - start)
+print(' '.join(m for m in {slow!r} if m in sys.modules))
+"""
+
+_verify_script = """
+import biggles
+system = biggles.System("Small System")
+biggles.Design("top").implements(system)
+system.design.add_property(mass="sum children")
+biggles.Requirement("shall weigh less than a tonne", mass__lte="1000kg").allocate_to(system)
+for i in range({size}):
+	subsystem = biggles.Subsystem("part {{}}".format(i), system)
+	biggles.Design("part {{}}".format(i)).implements(subsystem)
+	subsystem.design.add_property(mass="{{}}kg".format(i % 7 + 1))
+	biggles.Requirement("shall weigh less than 10kg", mass__lte="10kg").allocate_to(subsystem)
+system.verify()
+"""
+
+def _python(script, cwd):
+	start = time.time()
+	output = subprocess.check_output([sys.executable, '-c', script], cwd=cwd)
+	return time.time() - start, output
+
+def startup_benchmark(runs=5, size=200):
+	cwd = os.path.dirname(os.path.abspath(__file__))
+	results = []
+
+	for module in STARTUP_MODULES:
+		best = None
+		for i in range(runs):
+			try:
+				elapsed, output = _python(_import_script.format(module=module, slow=_slow_modules), cwd)
+			except subprocess.CalledProcessError:
+				break
+			seconds, loaded = output.split('\n')[:2]
+			best = min(best, float(seconds)) if best is not None else float(seconds)
+		if best is not None:
+			result = _record('import', module, 1, best, 1, 'imports/s')
+			result['loaded'] = loaded.split()
+			results.append(result)
+
+	best = min(_python(_verify_script.format(size=size), cwd)[0] for i in range(runs))
+	results.append(_record('verify_small', 'uniform', size, best, 1, 'runs/s'))
+
+	return results
+
+# Startup results over their budget, as (result, budget), scaling every budget for slower
+# machines
+def over_budget(results, scale=1.0):
+	over = []
+	for result in results:
+		budget = STARTUP_BUDGETS.get((result['benchmark'], result['generator']))
+		if budget is None:
+			continue
+		if result['seconds'] > budget * scale or (result['generator'] == 'biggles' and result.get('loaded')):
+			over.append((result, budget * scale))
+	return over
+
+
+def run_suite(generators=None, scale=1.0, parse_count=20000):
+	results = []
+	for generator in generators or sorted(GENERATORS):
+		results.extend(_in_child(_model_benchmarks, generator, max(2, int(DEFAULT_SIZES[generator] * scale))))
+	results.extend(_in_child(_parse_benchmark, max(1, int(parse_count * scale)), False))
+	return results
+
+# Results whose throughput dropped by more than tolerance against a baseline run
+def regressions(results, baseline, tolerance=0.2):
+	previous = dict(((r['benchmark'], r['generator'], r['size']), r) for r in baseline)
+	slower = []
+
+	for result in results:
+		before = previous.get((result['benchmark'], result['generator'], result['size']))
+		if before is None or not before['throughput'] or result['throughput'] is None:
+			continue
+		if result['throughput'] < before['throughput'] * (1 - tolerance):
+			slower.append((result, before))
+
+	return slower
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Benchmark biggles on synthetic models")
+	sub = parser.add_subparsers(dest='command')
+
+	suite = sub.add_parser('suite', help="time construction, property evaluation, parsing and verification")
+	suite.add_argument('--generator', action='append', choices=sorted(GENERATORS), help="model generators to run (default all)")
+	suite.add_argument('--scale', type=float, default=1.0, help="multiply every default model size")
+	suite.add_argument('--output', metavar='PATH', help="write results as JSON to PATH instead of stdout")
+	suite.add_argument('--baseline', metavar='PATH', help="fail if throughput regressed against this JSON results file")
+	suite.add_argument('--tolerance', type=float, default=0.2)
+
+	parse = sub.add_parser('parse', help="compare expression parsing against the prototype parsers")
+	parse.add_argument('--count', type=int, default=20000)
+
+	memory = sub.add_parser('memory', help="measure the memory used by a synthetic model")
+	memory.add_argument('--nodes', type=int, default=500000)
+	memory.add_argument('--compare', metavar='BIGGLES_PY', help="another biggles.py to build the same model with")
+
+	startup = sub.add_parser('startup', help="time imports and a small verify from a fresh interpreter, against budgets")
+	startup.add_argument('--runs', type=int, default=5)
+	startup.add_argument('--budget-scale', type=float, default=1.0, help="multiply every budget, for slower machines")
+
+	args = parser.parse_args()
+
+	if args.command == 'startup':
+		results = startup_benchmark(args.runs)
+		for result in results:
+			print("{:16} {:20} {:8.1f} ms  {}".format(result['benchmark'], result['generator'],
+				result['seconds'] * 1000, ' '.join(result.get('loaded', ()))))
+		over = over_budget(results, args.budget_scale)
+		for result, budget in over:
+			sys.stderr.write("{benchmark} {generator}: {ms:.1f} ms".format(ms=result['seconds'] * 1000, **result) +
+				", budget {:.1f} ms{}\n".format(budget * 1000, ", loaded " + ' '.join(result['loaded']) if result.get('loaded') else ""))
+		sys.exit(1 if over else 0)
+
+	if args.command == 'memory':
+		result = memory_benchmark(args.nodes, args.compare)
+		print("{nodes} subsystems: {kb} kB ({bytes_per_node:.0f} bytes/subsystem)".format(**result))
+		if args.compare:
+			print("{compare}: {compare_kb} kB ({compare_bytes_per_node:.0f} bytes/subsystem), {reduction:.0%} reduction".format(compare=args.compare, **result))
+		sys.exit(0)
+
+	if args.command == 'parse':
+		for result in _in_child(_parse_benchmark, args.count):
+			print("{benchmark:16} {generator:26} {throughput:10.0f} {unit}".format(**result))
+		sys.exit(0)
+
+	results = run_suite(args.generator, args.scale)
+
+	if args.output:
+		with open(args.output, 'w') as f:
+			json.dump(results, f, indent=1, sort_keys=True)
+	else:
+		print(json.dumps(results, indent=1, sort_keys=True))
+
+	if args.baseline:
+		with open(args.baseline) as f:
+			slower = regressions(results, json.load(f), args.tolerance)
+		for result, before in slower:
+			sys.stderr.write("{benchmark} on {generator} ({size}): {throughput:.0f} {unit}".format(**result) +
+				", was {:.0f}\n".format(before['throughput']))
+		sys.exit(1 if slower else 0)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+
+# Persistent verification cache. Verification results and property values are stored in a
+# SQLite file under the content keys biggles works out for each subsystem's own results and
+# each property (see _ContentKeys in biggles), so a cache can be kept between runs, or
+# shared by every CI job verifying the same models:
+#
+#   cache = VerificationCache('verify.cache')
+#   results = system.verify(cache=cache)
+#
+# Entries are never out of date, only unused; prune() drops anything that hasn't been used
+# for a while.
+
+import argparse
+import marshal
+import sqlite3
+import time
+
+from biggles import BigglesException
+
+class CacheException(BigglesException): pass
+
+_SCHEMA = '''
+	CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, data BLOB, used REAL);
+	CREATE TABLE IF NOT EXISTS property_values (key TEXT PRIMARY KEY, data BLOB, used REAL);
+'''
+
+# SQLite limits the number of parameters in one statement
+_query_size = 500
+
+# When an entry is used it's only marked as such if it hasn't been for this many seconds,
+# so a run that finds everything it needs doesn't write to the cache at all
+_use_interval = 3600
+
+
+class VerificationCache(object):
+	def __init__(self, path):
+		self.path = path
+		try:
+			self.db = sqlite3.connect(path)
+			self.db.text_factory = str
+			self.db.executescript(_SCHEMA)
+		except sqlite3.DatabaseError as e:
+			raise CacheException("Can't open verification cache {}: {}".format(path, e))
+
+		self.hits = 0
+		self.misses = 0
+
+	def close(self):
+		self.db.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def _load(self, table, keys):
+		keys = list(set(keys))
+		found = {}
+		now = time.time()
+		used = []
+
+		for start in range(0, len(keys), _query_size):
+			chunk = keys[start:start + _query_size]
+			marks = ','.join('?' * len(chunk))
+			for key, data, last_used in self.db.execute('SELECT key, data, used FROM {} WHERE key IN ({})'.format(table, marks), chunk):
+				found[key] = marshal.loads(str(data))
+				if last_used < now - _use_interval:
+					used.append(key)
+
+		if used:
+			with self.db:
+				for start in range(0, len(used), _query_size):
+					chunk = used[start:start + _query_size]
+					self.db.execute('UPDATE {} SET used = ? WHERE key IN ({})'.format(table, ','.join('?' * len(chunk))), [now] + chunk)
+
+		return found
+
+	def _store(self, table, entries):
+		entries = list(entries)
+		if not entries:
+			return
+
+		now = time.time()
+		with self.db:
+			self.db.executemany('INSERT OR REPLACE INTO {} VALUES (?, ?, ?)'.format(table),
+				((key, sqlite3.Binary(marshal.dumps(data)), now) for key, data in entries))
+
+	# Each subsystem's own results, as lists of (owner, severity, message), by key
+	def results(self, keys):
+		keys = list(keys)
+		found = self._load('results', keys)
+		self.hits += len(found)
+		self.misses += len(set(keys)) - len(found)
+		return found
+
+	def store_results(self, entries):
+		self._store('results', entries)
+
+	# Each design's plain property values, as dicts, by key
+	def values(self, keys):
+		return self._load('property_values', keys)
+
+	def store_values(self, entries):
+		self._store('property_values', entries)
+
+	# Drops entries unused for the given number of days
+	def prune(self, days):
+		cutoff = time.time() - days * 86400
+		with self.db:
+			count = sum(self.db.execute('DELETE FROM {} WHERE used < ?'.format(table), (cutoff,)).rowcount
+				for table in ('results', 'property_values'))
+		self.db.execute('VACUUM')
+		return count
+
+	def clear(self):
+		with self.db:
+			self.db.execute('DELETE FROM results')
+			self.db.execute('DELETE FROM property_values')
+
+	def stats(self):
+		return dict((table, self.db.execute('SELECT COUNT(*) FROM {}'.format(table)).fetchone()[0])
+			for table in ('results', 'property_values'))
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Inspect or tidy up a biggles verification cache")
+	parser.add_argument('cache', help="path of the cache file")
+	parser.add_argument('--prune', type=float, metavar='DAYS', help="drop entries unused for this many days")
+	parser.add_argument('--clear', action='store_true', help="drop every entry")
+	args = parser.parse_args()
+
+	with VerificationCache(args.cache) as cache:
+		if args.clear:
+			cache.clear()
+		elif args.prune is not None:
+			print "Dropped {} entries".format(cache.prune(args.prune))
+
+		for table, count in sorted(cache.stats().iteritems()):
+			print "{:<20}{}".format(table, count)
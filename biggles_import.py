@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+
+# Bulk model import from tabular (CSV) or JSON-lines exports. Records are read as they
+# stream in and kept as compact tuples, then the whole graph is built in a single pass in
+# dependency order (see biggles.BulkBuilder), so rows can appear in any order and forward
+# references are fine.
+#
+# Every record has a type and most have an id that other records refer to:
+#
+#   subsystem    id, name, parent, kind ("system", "user" or "subsystem")
+#   interface    id, name, systems (a list, or ';'-separated in CSV)
+#   design       id, name, implements, properties (a dict; in CSV any other column)
+#   property     design, name, value
+#   requirement  id, text, class, parent, parameter (e.g. "mass__lte"), value, allocated_to
+#
+# CSV files either carry a "type" column or are read with an explicit record_type.
+
+import argparse
+import csv
+import json
+
+import biggles
+from biggles import BigglesException, Design, Requirement, Subsystem
+
+class ImportException(BigglesException): pass
+
+RECORD_TYPES = ('subsystem', 'interface', 'design', 'property', 'requirement')
+
+_design_columns = frozenset(['type', 'id', 'name', 'implements', 'properties'])
+
+
+def _blank(value):
+	return value is None or value == ''
+
+
+class BulkImporter(object):
+	def __init__(self):
+		self.subsystems = []
+		self.interfaces = []
+		self.designs = []
+		self.properties = []
+		self.requirements = []
+
+	# Reading
+
+	def add_records(self, records, record_type=None):
+		for record in records:
+			self._add(record_type or record.get('type'), record)
+
+	def read_jsonl(self, path):
+		with open(path) as f:
+			self.add_records(json.loads(line) for line in f if line.strip())
+
+	def read_csv(self, path, record_type=None):
+		with open(path, 'rb') as f:
+			self.add_records(csv.DictReader(f), record_type)
+
+	def _add(self, kind, record):
+		get = record.get
+
+		if kind == 'subsystem':
+			self.subsystems.append((get('id'), get('name'), None if _blank(get('parent')) else get('parent'), get('kind') or 'subsystem'))
+
+		elif kind == 'interface':
+			systems = get('systems')
+			if isinstance(systems, basestring):
+				systems = systems.split(';')
+			self.interfaces.append((get('id'), get('name') or None, systems))
+
+		elif kind == 'design':
+			properties = get('properties') or {}
+			if not isinstance(properties, dict):
+				raise ImportException("Design '{}' has properties that aren't a mapping".format(get('id')))
+			properties = dict(properties)
+			for column, value in record.iteritems():
+				if column not in _design_columns and not _blank(value):
+					properties[column] = value
+			self.designs.append((get('id'), get('name'), get('implements'), properties))
+
+		elif kind == 'property':
+			self.properties.append((get('design'), get('name'), get('value')))
+
+		elif kind == 'requirement':
+			self.requirements.append((get('id'), get('text'), get('class') or 'Requirement',
+				None if _blank(get('parent')) else get('parent'),
+				None if _blank(get('parameter')) else get('parameter'), get('value'),
+				None if _blank(get('allocated_to')) else get('allocated_to')))
+
+		else:
+			raise ImportException("Unknown record type '{}'".format(kind))
+
+	# Building
+
+	# The model is built in the given model context, or the current one
+	def build(self, context=None):
+		with biggles.BulkBuilder(context) as builder:
+			return self._build(builder)
+
+	def _build(self, builder):
+		subsystems = self._build_subsystems()
+		systems = [subsystem for subsystem in subsystems.itervalues() if isinstance(subsystem, biggles.System)]
+		if len(systems) != 1:
+			raise ImportException("Expected exactly one system record, found {}".format(len(systems)))
+
+		things = dict(subsystems)
+		for id, name, systems_ids in self.interfaces:
+			interface = builder.connect(name, [self._lookup(subsystems, sid, 'subsystem') for sid in systems_ids])
+			if id is not None:
+				things[id] = interface
+
+		self._build_designs(builder, subsystems)
+		self._build_requirements(builder, things)
+
+		return systems[0]
+
+	def _lookup(self, index, id, kind):
+		try:
+			return index[id]
+		except KeyError:
+			raise ImportException("Unknown {} '{}'".format(kind, id))
+
+	def _build_subsystems(self):
+		rows = {}
+		for row in self.subsystems:
+			if row[0] in rows:
+				raise ImportException("Duplicate subsystem id '{}'".format(row[0]))
+			rows[row[0]] = row
+
+		built = {}
+		for row in self.subsystems:
+			# Walk up to the first ancestor that already exists and build back down
+			chain = []
+			while row[0] not in built:
+				chain.append(row)
+				parent = row[2]
+				if parent is None or parent in built:
+					break
+				if parent not in rows:
+					raise ImportException("Subsystem '{}' has unknown parent '{}'".format(row[0], parent))
+				row = rows[parent]
+				if len(chain) > len(rows):
+					raise ImportException("Subsystem parents form a cycle at '{}'".format(row[0]))
+
+			for id, name, parent, kind in reversed(chain):
+				if kind == 'system':
+					built[id] = biggles.System(name)
+				elif kind == 'user':
+					built[id] = biggles.User(name)
+				else:
+					built[id] = Subsystem(name, built[parent] if parent is not None else None)
+
+		return built
+
+	def _build_designs(self, builder, subsystems):
+		designs = {}
+		for id, name, implements, properties in self.designs:
+			designs[id] = (name, implements, properties)
+
+		for design_id, name, value in self.properties:
+			self._lookup(designs, design_id, 'design')[2][name] = value
+
+		for id, name, implements, properties in self.designs:
+			design = Design(name)
+			builder.add_properties(design, dict((str(prop), value) for prop, value in properties.iteritems()))
+			if implements is not None:
+				design.implements(self._lookup(subsystems, implements, 'subsystem'))
+
+	def _build_requirements(self, builder, things):
+		requirements = {}
+		rows = dict((row[0], row) for row in self.requirements)
+
+		def build(row):
+			# Parents first, without recursing down long derivation chains
+			chain = [row]
+			while chain[-1][3] is not None and chain[-1][3] not in requirements:
+				chain.append(self._lookup(rows, chain[-1][3], 'requirement'))
+				if len(chain) > len(rows):
+					raise ImportException("Requirement parents form a cycle at '{}'".format(row[0]))
+
+			for id, text, cls_name, parent, parameter, value, allocated_to in reversed(chain):
+				cls = getattr(biggles, cls_name, None)
+				if not (isinstance(cls, type) and issubclass(cls, Requirement)):
+					raise ImportException("Unknown requirement class '{}'".format(cls_name))
+
+				parametrics = {str(parameter): value} if parameter is not None else {}
+				if issubclass(cls, biggles.DerivedRequirement):
+					requirement = cls(requirements[parent], text, **parametrics)
+				else:
+					requirement = cls(text, **parametrics)
+					if parent is not None:
+						requirements[parent].parent_of(requirement)
+				requirements[id] = requirement
+
+		for row in self.requirements:
+			if row[0] not in requirements:
+				build(row)
+
+		# Allocations are taken as exported, in row order
+		for id, text, cls_name, parent, parameter, value, allocated_to in self.requirements:
+			if allocated_to is not None:
+				builder.allocate(requirements[id], self._lookup(things, allocated_to, 'subsystem or interface'))
+
+		return requirements
+
+
+def import_model(jsonl=(), csv_files=(), context=None):
+	importer = BulkImporter()
+	for path in jsonl:
+		importer.read_jsonl(path)
+	for path, record_type in csv_files:
+		importer.read_csv(path, record_type)
+	return importer.build(context)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Import a biggles model from CSV or JSON-lines exports")
+	parser.add_argument('--jsonl', action='append', default=[], metavar='PATH')
+	parser.add_argument('--csv', action='append', default=[], metavar='[TYPE=]PATH',
+		help="CSV file, optionally prefixed with the record type of every row, e.g. design=designs.csv")
+	parser.add_argument('--snapshot', metavar='PATH', help="save the imported model as a binary snapshot")
+	parser.add_argument('--verify', action='store_true', help="verify the imported model")
+	args = parser.parse_args()
+
+	csv_files = []
+	for spec in args.csv:
+		record_type, _, path = spec.rpartition('=')
+		if record_type and record_type not in RECORD_TYPES:
+			parser.error("Unknown record type '{}'".format(record_type))
+		csv_files.append((path, record_type or None))
+
+	system = import_model(args.jsonl, csv_files)
+
+	if args.snapshot:
+		import biggles_snapshot
+		biggles_snapshot.save(system, args.snapshot)
+
+	if args.verify:
+		biggles.prettyprint_verification(system.iter_verify())
@@ -0,0 +1,309 @@
+#!/usr/bin/env python
+
+# Long-running verification service. Models stay loaded with their property caches warm, so
+# a verify after an edit only re-checks what the edit touched. Clients connect over a local
+# (Unix domain) socket and send one JSON object per line, getting one JSON object back per
+# request:
+#
+#   {"op": "load", "model": NAME, "snapshot": PATH}             or "jsonl"/"csv" lists, or "script"
+#   {"op": "unload", "model": NAME}
+#   {"op": "models"}
+#   {"op": "verify", "model": NAME, "severities": [...]}         severities are optional
+#   {"op": "edit", "model": NAME, "subsystem": NAME, "properties": {PROP: VALUE, ...}}
+#   {"op": "get", "model": NAME, "property": "subsystem.property"}
+#   {"op": "subscribe", "model": NAME}
+#
+# Replies are {"ok": true, ...} or {"ok": false, "error": MESSAGE}. After every edit the
+# model is re-verified and each subscriber is sent {"event": "delta", "model": NAME,
+# "added": [...], "removed": [...]}, the results that appeared and disappeared, each as
+# [owner, severity, message].
+#
+# The socket is created readable and writable by its owner only, and clients can only load
+# model scripts if the service was started with --allow-scripts.
+#
+# Each client gets a thread of its own. Every model lives in a model context of its own, so
+# requests for different models run side by side; requests for the same model take turns
+# on its context's lock.
+
+import argparse
+import collections
+import json
+import os
+import socket
+import SocketServer
+import threading
+
+import biggles
+from biggles import BigglesException
+
+class ServiceException(BigglesException): pass
+
+def _json_value(value):
+	if value is None or isinstance(value, (bool, int, long, float)):
+		return value
+	return str(value)
+
+def _result_tuple(result):
+	return (str(result.owner), result.severity, result.message)
+
+
+class _Model(object):
+	def __init__(self, name, context):
+		self.name = name
+		self.context = context
+		self.system = system = context.system
+		self.subscribers = []
+		self.results = None
+
+		# The subtree first, then anything only reachable over an interface (users, say)
+		subtree = biggles._subtree(system)
+		self.subsystems = {}
+		for subsystem in subtree:
+			self.subsystems.setdefault(subsystem.name, []).append(subsystem)
+		seen = set(subtree)
+		for subsystem in subtree:
+			for remote in subsystem.neighbours():
+				if remote not in seen:
+					seen.add(remote)
+					self.subsystems.setdefault(remote.name, []).append(remote)
+
+	def subsystem(self, name):
+		subsystems = self.subsystems.get(name, ())
+		if len(subsystems) != 1:
+			raise ServiceException("'{}' names {} subsystems in model '{}'".format(name, len(subsystems), self.name))
+		return subsystems[0]
+
+	# Verifies incrementally and returns the results that were added and removed since the
+	# last verification. The same result can come up more than once, so each is counted.
+	def verify(self):
+		results = [_result_tuple(result) for result in self.system.iter_verify(incremental=self.results is not None)]
+		previous = collections.Counter(self.results or ())
+		current = collections.Counter(results)
+		self.results = results
+		return sorted((current - previous).elements()), sorted((previous - current).elements())
+
+
+# Loading a model script runs arbitrary code, so it's only allowed when the service is
+# started with allow_scripts
+class VerificationService(object):
+	def __init__(self, allow_scripts=False):
+		self.models = {}
+		self.lock = threading.Lock()
+		self.allow_scripts = allow_scripts
+
+	def handle(self, request, connection):
+		if not isinstance(request, dict):
+			raise ServiceException("Requests must be JSON objects")
+
+		op = request.get('op')
+		handler = getattr(self, 'op_' + str(op), None)
+		if handler is None:
+			raise ServiceException("Unknown operation '{}'".format(op))
+
+		if op in ('models', 'load', 'unload'):
+			return handler(request, connection)
+
+		model = self._model(request)
+		with model.context.lock:
+			with model.context:
+				return handler(model, request, connection)
+
+	def _model(self, request):
+		with self.lock:
+			model = self.models.get(request.get('model'))
+		if model is None:
+			raise ServiceException("No model named '{}' is loaded".format(request.get('model')))
+		return model
+
+	def op_models(self, request, connection):
+		with self.lock:
+			return {'models': sorted(self.models)}
+
+	def op_load(self, request, connection):
+		name = request['model']
+		with self.lock:
+			if name in self.models:
+				raise ServiceException("A model named '{}' is already loaded".format(name))
+			self.models[name] = None
+
+		try:
+			context = biggles.ModelContext(name)
+			with context:
+				if 'snapshot' in request:
+					import biggles_snapshot
+					biggles_snapshot.load(request['snapshot'])
+				elif 'script' in request:
+					if not self.allow_scripts:
+						raise ServiceException("This service doesn't load model scripts")
+					execfile(request['script'], {'__name__': '__biggles_model__'})
+				else:
+					import biggles_import
+					csv_files = []
+					for spec in request.get('csv', ()):
+						record_type, _, path = spec.rpartition('=')
+						csv_files.append((path, record_type or None))
+					biggles_import.import_model(request.get('jsonl', ()), csv_files)
+
+				if context.system is None:
+					raise ServiceException("Model '{}' didn't define a System".format(name))
+
+				model = _Model(name, context)
+				model.verify()
+		except:
+			with self.lock:
+				del self.models[name]
+			raise
+
+		with self.lock:
+			self.models[name] = model
+		return {'model': name, 'results': len(model.results)}
+
+	def op_unload(self, request, connection):
+		with self.lock:
+			if self.models.get(request.get('model')) is None:
+				raise ServiceException("No model named '{}' is loaded".format(request.get('model')))
+			del self.models[request['model']]
+		return {}
+
+	def op_verify(self, model, request, connection):
+		model.verify()
+
+		severities = request.get('severities')
+		results = [list(r) for r in model.results if severities is None or r[1] in severities]
+		return {'results': results}
+
+	def op_edit(self, model, request, connection):
+		subsystem = model.subsystem(request['subsystem'])
+		if subsystem.design is None:
+			raise ServiceException("Subsystem '{}' has no design to edit".format(subsystem.name))
+
+		subsystem.design.add_property(**dict((str(prop), value) for prop, value in request['properties'].iteritems()))
+
+		added, removed = model.verify()
+		delta = {'event': 'delta', 'model': model.name, 'added': [list(r) for r in added], 'removed': [list(r) for r in removed]}
+		for subscriber in list(model.subscribers):
+			if not subscriber.send(delta):
+				model.subscribers.remove(subscriber)
+
+		return {'added': len(added), 'removed': len(removed)}
+
+	def op_get(self, model, request, connection):
+		name, _, prop = request['property'].rpartition('.')
+		subsystem = model.subsystem(name)
+		if subsystem.design is None:
+			raise ServiceException("Subsystem '{}' has no design".format(name))
+		return {'value': _json_value(subsystem.design.get_property(str(prop)))}
+
+	def op_subscribe(self, model, request, connection):
+		if connection not in model.subscribers:
+			model.subscribers.append(connection)
+		return {}
+
+
+class _Connection(SocketServer.StreamRequestHandler):
+	def setup(self):
+		SocketServer.StreamRequestHandler.setup(self)
+		self.write_lock = threading.Lock()
+
+	# Replies and pushed deltas can come from different threads
+	def send(self, message):
+		try:
+			with self.write_lock:
+				self.wfile.write(json.dumps(message) + "\n")
+				self.wfile.flush()
+			return True
+		except (IOError, socket.error):
+			return False
+
+	def handle(self):
+		service = self.server.service
+		for line in iter(self.rfile.readline, ''):
+			if not line.strip():
+				continue
+
+			try:
+				reply = service.handle(json.loads(line), self)
+				reply['ok'] = True
+			except (BigglesException, KeyError, ValueError, TypeError, EnvironmentError) as e:
+				reply = {'ok': False, 'error': str(e)}
+
+			if not self.send(reply):
+				break
+
+class _Server(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+	daemon_threads = True
+
+# The socket is only accessible to the user running the service
+def serve(path, service=None):
+	if os.path.exists(path):
+		os.unlink(path)
+
+	umask = os.umask(0o177)
+	try:
+		server = _Server(path, _Connection)
+	finally:
+		os.umask(umask)
+	server.service = service or VerificationService()
+	return server
+
+
+# A blocking client. Deltas pushed to a subscribed client are queued up in between replies
+# and read with next_event().
+class Client(object):
+	def __init__(self, path):
+		self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.socket.connect(path)
+		self.file = self.socket.makefile('rwb')
+		self.events = []
+
+	def close(self):
+		self.file.close()
+		self.socket.close()
+
+	def _read(self):
+		line = self.file.readline()
+		if not line:
+			raise ServiceException("The service closed the connection")
+		return json.loads(line)
+
+	def request(self, op, **kwargs):
+		kwargs['op'] = op
+		self.file.write(json.dumps(kwargs) + "\n")
+		self.file.flush()
+
+		while True:
+			message = self._read()
+			if 'event' in message:
+				self.events.append(message)
+				continue
+			if not message.pop('ok'):
+				raise ServiceException(message['error'])
+			return message
+
+	def next_event(self):
+		if self.events:
+			return self.events.pop(0)
+		return self._read()
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Serve biggles verification over a local socket")
+	parser.add_argument('socket', help="path of the Unix domain socket to listen on")
+	parser.add_argument('--snapshot', action='append', default=[], metavar='NAME=PATH', help="load a snapshot at startup")
+	parser.add_argument('--script', action='append', default=[], metavar='NAME=PATH', help="run a model script at startup")
+	parser.add_argument('--allow-scripts', action='store_true', help="let clients load models by running scripts")
+	args = parser.parse_args()
+
+	# Scripts named on the command line are always run
+	server = serve(args.socket, VerificationService(allow_scripts=True))
+	for kind, specs in (('snapshot', args.snapshot), ('script', args.script)):
+		for spec in specs:
+			name, _, path = spec.partition('=')
+			server.service.handle({'op': 'load', 'model': name, kind: path}, None)
+	server.service.allow_scripts = args.allow_scripts
+
+	try:
+		server.serve_forever()
+	finally:
+		server.server_close()
+		os.unlink(args.socket)
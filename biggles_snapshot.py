@@ -0,0 +1,394 @@
+#!/usr/bin/env python
+
+# Binary model snapshots. A snapshot is a header followed by a set of flat arrays (int32,
+# float64 and one blob of string bytes) describing the hierarchy, interfaces, designs,
+# requirements and allocations by index, each 8-byte aligned.
+#
+# Loading maps the file read-only and, with numpy, views each array straight out of the
+# mapping, so processes loading the same snapshot share its pages through the OS rather
+# than each reading a copy. The model is then built from the arrays in bulk (see
+# biggles.BulkBuilder): subsystems and designs are created without the cache, column and
+# index updates that building the same model call by call pays for each object.
+#
+# What's shared read-only is the file. The model itself is ordinary Python objects, which
+# can't live in a mapping; parallel verification workers get them the way they get any
+# other model, forked copy-on-write from the process that loaded it.
+
+import array
+import mmap
+import struct
+import sys
+
+import biggles
+from biggles import BigglesException, Interface, Requirement, Subsystem
+
+class SnapshotException(BigglesException): pass
+
+MAGIC = 'BGLS'
+VERSION = 1
+
+# Every array in a snapshot, in file order, with its array typecode
+SECTIONS = (
+	('string_offsets',		'i'),
+	('string_data',			'c'),
+
+	('subsystem_class',		'i'),
+	('subsystem_name',		'i'),
+	('subsystem_parent',	'i'),
+
+	('interface_name',		'i'),
+	('interface_offsets',	'i'),
+	('interface_systems',	'i'),
+
+	('design_name',			'i'),
+	('design_subsystem',	'i'),
+	('property_design',		'i'),
+	('property_name',		'i'),
+	('property_kind',		'i'),
+	('property_string',		'i'),
+	('property_number',		'd'),
+
+	('requirement_class',	'i'),
+	('requirement_text',	'i'),
+	('requirement_parent',	'i'),
+	('requirement_key',		'i'),
+	('requirement_kind',	'i'),
+	('requirement_string',	'i'),
+	('requirement_number',	'd'),
+	('requirement_owner',	'i'),
+
+	# Allocation lists, in order, for subsystems then interfaces
+	('allocation_offsets',	'i'),
+	('allocation_members',	'i'),
+)
+
+_HEADER = struct.Struct('<4sII')
+_DTYPES = {'i': '<i4', 'd': '<f8', 'c': 'S1'}
+_SECTION = struct.Struct('<QQ')
+
+# Value kinds
+NONE, STRING, UNICODE, BOOL, INT, FLOAT = range(6)
+
+
+class _Strings(object):
+	def __init__(self):
+		self.index = {}
+		self.offsets = array.array('i', [0])
+		self.data = []
+		self.size = 0
+
+	def add(self, string):
+		if string is None:
+			return -1
+		if isinstance(string, unicode):
+			string = string.encode('utf-8')
+
+		try:
+			return self.index[string]
+		except KeyError:
+			pass
+
+		i = self.index[string] = len(self.offsets) - 1
+		self.data.append(string)
+		self.size += len(string)
+		self.offsets.append(self.size)
+		return i
+
+
+def _encode_value(value, strings):
+	if value is None:
+		return NONE, -1, 0.0
+	if isinstance(value, bool):
+		return BOOL, -1, float(value)
+	if isinstance(value, (int, long)):
+		return INT, -1, float(value)
+	if isinstance(value, float):
+		return FLOAT, -1, value
+	if isinstance(value, unicode):
+		return UNICODE, strings.add(value), 0.0
+	if isinstance(value, str):
+		return STRING, strings.add(value), 0.0
+
+	raise SnapshotException("Can't store a value of type {} in a snapshot".format(type(value).__name__))
+
+def _decode_value(kind, string, number, strings):
+	if kind == NONE:
+		return None
+	if kind == BOOL:
+		return bool(number)
+	if kind == INT:
+		return int(number)
+	if kind == FLOAT:
+		return number
+	if kind == UNICODE:
+		return strings(string).decode('utf-8')
+	return strings(string)
+
+
+# Parents always come before their children. A subsystem reached through an interface
+# brings in its ancestors first, whether or not they're reachable any other way.
+def _collect_subsystems(system):
+	subsystems = [system]
+	seen = set(subsystems)
+	interfaces = []
+	seen_interfaces = set()
+
+	for subsystem in subsystems:
+		for obj in list(subsystem.children) + subsystem.neighbours():
+			chain = []
+			while obj is not None and obj not in seen:
+				chain.append(obj)
+				obj = obj.parent
+			for obj in reversed(chain):
+				seen.add(obj)
+				subsystems.append(obj)
+
+		for inter in subsystem.interfaces:
+			if inter not in seen_interfaces:
+				seen_interfaces.add(inter)
+				interfaces.append(inter)
+
+	return subsystems, interfaces
+
+# Parents always come before the requirements derived from them
+def _collect_requirements(things):
+	found = []
+	seen = set()
+
+	def add(requirement):
+		stack = [requirement]
+		while stack:
+			requirement = stack.pop()
+			if requirement not in seen:
+				seen.add(requirement)
+				found.append(requirement)
+				stack.extend(reversed(requirement.children))
+
+	for thing in things:
+		for requirement in thing.requirements:
+			root = requirement
+			while getattr(root, 'parent', None) is not None:
+				root = root.parent
+			add(root)
+
+	return found
+
+
+def save(system, path):
+	strings = _Strings()
+	arrays = dict((name, array.array(typecode)) for name, typecode in SECTIONS if name != 'string_data')
+
+	subsystems, interfaces = _collect_subsystems(system)
+	subsystem_index = dict((subsystem, i) for i, subsystem in enumerate(subsystems))
+	interface_index = dict((inter, i) for i, inter in enumerate(interfaces))
+
+	for subsystem in subsystems:
+		arrays['subsystem_class'].append(strings.add(type(subsystem).__name__))
+		arrays['subsystem_name'].append(strings.add(subsystem.name))
+		arrays['subsystem_parent'].append(subsystem_index[subsystem.parent] if subsystem.parent is not None else -1)
+
+	arrays['interface_offsets'].append(0)
+	for inter in interfaces:
+		arrays['interface_name'].append(strings.add(inter.name))
+		arrays['interface_systems'].extend(subsystem_index[obj] for obj in inter.systems)
+		arrays['interface_offsets'].append(len(arrays['interface_systems']))
+
+	designs = [subsystem.design for subsystem in subsystems if subsystem.design is not None]
+	for i, design in enumerate(designs):
+		arrays['design_name'].append(strings.add(design.name))
+		arrays['design_subsystem'].append(subsystem_index[design.subsystem])
+
+		for prop, value in sorted(design.properties.items()):
+			kind, string, number = _encode_value(value, strings)
+			arrays['property_design'].append(i)
+			arrays['property_name'].append(strings.add(prop))
+			arrays['property_kind'].append(kind)
+			arrays['property_string'].append(string)
+			arrays['property_number'].append(number)
+
+	requirements = _collect_requirements(subsystems + interfaces)
+	requirement_index = dict((requirement, i) for i, requirement in enumerate(requirements))
+	parents = dict((child, parent) for parent in requirements for child in parent.children)
+
+	for requirement in requirements:
+		arrays['requirement_class'].append(strings.add(type(requirement).__name__))
+		arrays['requirement_text'].append(strings.add(requirement.text))
+		arrays['requirement_parent'].append(requirement_index[parents[requirement]] if requirement in parents else -1)
+
+		if requirement.parameter is None:
+			key, (kind, string, number) = -1, (NONE, -1, 0.0)
+		else:
+			parameter, operation, literal = requirement.parameter
+			key = strings.add("{}__{}".format(parameter, operation))
+			kind, string, number = _encode_value(literal, strings)
+		arrays['requirement_key'].append(key)
+		arrays['requirement_kind'].append(kind)
+		arrays['requirement_string'].append(string)
+		arrays['requirement_number'].append(number)
+
+		owner = requirement.allocated_to
+		if owner is None:
+			arrays['requirement_owner'].append(-1)
+		elif isinstance(owner, Interface):
+			arrays['requirement_owner'].append(len(subsystems) + interface_index[owner])
+		else:
+			arrays['requirement_owner'].append(subsystem_index[owner])
+
+	arrays['allocation_offsets'].append(0)
+	for thing in subsystems + interfaces:
+		arrays['allocation_members'].extend(requirement_index[requirement] for requirement in thing.requirements)
+		arrays['allocation_offsets'].append(len(arrays['allocation_members']))
+
+	arrays['string_offsets'] = strings.offsets
+	blobs = []
+	for name, typecode in SECTIONS:
+		if name == 'string_data':
+			blobs.append(''.join(strings.data))
+		else:
+			data = arrays[name]
+			if sys.byteorder != 'little':
+				data = array.array(typecode, data)
+				data.byteswap()
+			blobs.append(data.tostring())
+
+	offset = _HEADER.size + _SECTION.size * len(SECTIONS)
+	table = []
+	for blob in blobs:
+		table.append(_SECTION.pack(offset, len(blob)))
+		# Keep every section 8-byte aligned so float64 arrays can be viewed in place
+		offset += len(blob) + (-len(blob) % 8)
+
+	with open(path, 'wb') as f:
+		f.write(_HEADER.pack(MAGIC, VERSION, len(SECTIONS)))
+		f.write(''.join(table))
+		for blob in blobs:
+			f.write(blob)
+			f.write('\0' * (-len(blob) % 8))
+
+
+class Snapshot(object):
+	def __init__(self, path):
+		with open(path, 'rb') as f:
+			try:
+				self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			except ValueError:
+				raise SnapshotException("{} isn't a biggles snapshot".format(path))
+
+		if len(self.map) < _HEADER.size:
+			raise SnapshotException("{} isn't a biggles snapshot".format(path))
+		magic, version, count = _HEADER.unpack_from(self.map, 0)
+		if magic != MAGIC:
+			raise SnapshotException("{} isn't a biggles snapshot".format(path))
+		if version != VERSION or count != len(SECTIONS):
+			raise SnapshotException("{} is snapshot version {}, expected {}".format(path, version, VERSION))
+
+		self.sections = {}
+		for i, (name, typecode) in enumerate(SECTIONS):
+			self.sections[name] = _SECTION.unpack_from(self.map, _HEADER.size + i * _SECTION.size)
+
+		self._strings = None
+
+	# A read-only view of an array in the mapping, or a copy of it without numpy. Views
+	# mustn't outlive close().
+	def array(self, name):
+		offset, size = self.sections[name]
+		typecode = dict(SECTIONS)[name]
+
+		np = biggles._numpy()
+		if np is not None:
+			dtype = np.dtype(_DTYPES[typecode])
+			return np.frombuffer(self.map, dtype=dtype, count=size // dtype.itemsize, offset=offset)
+
+		data = array.array(typecode)
+		data.fromstring(buffer(self.map, offset, size))
+		if sys.byteorder != 'little':
+			data.byteswap()
+		return data
+
+	# An array's values as a list
+	def values(self, name):
+		return self.array(name).tolist()
+
+	def strings(self):
+		if self._strings is None:
+			offsets = self.values('string_offsets')
+			base, size = self.sections['string_data']
+			data = self.map[base:base + size]
+			self._strings = [intern(data[start:end]) for start, end in zip(offsets, offsets[1:])]
+		return self._strings
+
+	def close(self):
+		self.map.close()
+
+
+def _model_class(name, base):
+	cls = getattr(biggles, name, None)
+	if not (isinstance(cls, type) and issubclass(cls, base)):
+		raise SnapshotException("Snapshot refers to unknown class {}".format(name))
+	return cls
+
+# The model is built in the given model context, or the current one
+def load(path, context=None):
+	snapshot = Snapshot(path)
+	try:
+		with biggles.BulkBuilder(context) as builder:
+			return _build(snapshot, builder)
+	finally:
+		snapshot.close()
+
+def _build(snapshot, builder):
+	strings = snapshot.strings()
+	string = lambda i: strings[i] if i >= 0 else None
+	classes = {}
+
+	def model_class(i, base):
+		try:
+			return classes[i]
+		except KeyError:
+			cls = classes[i] = _model_class(string(i), base)
+			return cls
+
+	subsystems = builder.subsystems([model_class(cls, Subsystem) for cls in snapshot.values('subsystem_class')],
+		[strings[name] for name in snapshot.values('subsystem_name')], snapshot.values('subsystem_parent'))
+
+	interfaces = []
+	offsets = snapshot.values('interface_offsets')
+	members = snapshot.values('interface_systems')
+	for i, name in enumerate(snapshot.values('interface_name')):
+		interfaces.append(builder.connect(string(name), [subsystems[j] for j in members[offsets[i]:offsets[i + 1]]]))
+
+	names = snapshot.values('design_name')
+	properties = [{} for name in names]
+	for design, name, kind, value, number in zip(snapshot.values('property_design'), snapshot.values('property_name'),
+			snapshot.values('property_kind'), snapshot.values('property_string'), snapshot.values('property_number')):
+		properties[design][strings[name]] = strings[value] if kind == STRING else _decode_value(kind, value, number, string)
+
+	builder.designs([string(name) for name in names], [subsystems[i] for i in snapshot.values('design_subsystem')], properties)
+
+	requirements = []
+	for cls, text, parent, key, kind, value, number in zip(snapshot.values('requirement_class'), snapshot.values('requirement_text'),
+			snapshot.values('requirement_parent'), snapshot.values('requirement_key'), snapshot.values('requirement_kind'),
+			snapshot.values('requirement_string'), snapshot.values('requirement_number')):
+		cls = model_class(cls, Requirement)
+		parametrics = {string(key): _decode_value(kind, value, number, string)} if key >= 0 else {}
+
+		if issubclass(cls, biggles.DerivedRequirement):
+			requirement = cls(requirements[parent], string(text), **parametrics)
+		else:
+			requirement = cls(string(text), **parametrics)
+			if parent >= 0:
+				requirements[parent].parent_of(requirement)
+		requirements.append(requirement)
+
+	# Allocations are restored in each thing's saved order
+	things = subsystems + interfaces
+	owners = snapshot.values('requirement_owner')
+	offsets = snapshot.values('allocation_offsets')
+	members = snapshot.values('allocation_members')
+	for i, thing in enumerate(things):
+		for j in members[offsets[i]:offsets[i + 1]]:
+			if owners[j] != i:
+				raise SnapshotException("Requirement {} is listed under the wrong owner".format(j))
+			builder.allocate(requirements[j], thing)
+
+	return subsystems[0]
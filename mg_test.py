@@ -1,7 +1,17 @@
 #!/usr/bin/env python3
 
-from pint import UnitRegistry
-ur = UnitRegistry()
+# The unit registry is slow to build, so it's only built the first time a unit is used
+class _LazyRegistry(object):
+	def __init__(self):
+		self._registry = None
+
+	def __getattr__(self, name):
+		if self._registry is None:
+			from pint import UnitRegistry
+			self._registry = UnitRegistry()
+		return getattr(self._registry, name)
+
+ur = _LazyRegistry()
 
 from modgrammar import *
 grammar_whitespace_mode = "optional"
@@ -110,6 +120,14 @@ class Thing(object):
 tv2 = Thing()
 tv2.atb = 9
 
-parser = Expression.parser()
-result = parser.parse_text("5+2*3", eof=True)
-print(process(result))
+_parser = None
+
+# Building a parser is slow too, so there's one per process
+def parse(text):
+	global _parser
+	if _parser is None:
+		_parser = Expression.parser()
+	return process(_parser.parse_text(text, reset=True, eof=True))
+
+if __name__ == '__main__':
+	print(parse("5+2*3"))